@@ -17,6 +17,8 @@ document.addEventListener('DOMContentLoaded', () => {
     let browseSort = 'random';
     let browsePage = 1;
     let browseTotalPages = 1;
+    let browseSeed = null; // Shuffle seed, kept across pages so 'random' order is stable
+    let stylesLoaded = false;
 
     // Favorites State
     let favorites = [];
@@ -221,6 +223,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 })
             });
 
+            if (response.status === 429) {
+                const retryAfter = response.headers.get('Retry-After') || '1';
+                showError(`Too many searches right now. Please try again in ${retryAfter}s.`);
+                return;
+            }
             if (!response.ok) throw new Error('Search failed');
             const data = await response.json();
 
@@ -264,13 +271,13 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Browse Mode Logic ---
 
     async function loadBrowseData() {
-        // Load styles from API
-        try {
-            const response = await fetch('/api/styles');
-            const data = await response.json();
-            populateStyleSelect(data.styles || []);
-        } catch (error) {
-            console.error('Failed to load styles:', error);
+        // Load styles once per session (revalidated with the server via ETag)
+        if (!stylesLoaded) {
+            const styles = await fetchStyles();
+            if (styles) {
+                populateStyleSelect(styles);
+                stylesLoaded = true;
+            }
         }
 
         // Populate mood select with all moods (same as AI/Search)
@@ -285,6 +292,7 @@ document.addEventListener('DOMContentLoaded', () => {
             option.textContent = style;
             browseStyleSelect.appendChild(option);
         });
+        browseStyleSelect.value = browseStyle;
     }
 
     function populateBrowseMoodSelect() {
@@ -297,6 +305,7 @@ document.addEventListener('DOMContentLoaded', () => {
             option.textContent = mood;
             browseMoodSelect.appendChild(option);
         });
+        browseMoodSelect.value = browseMood;
     }
 
     // Browse Language Selection
@@ -326,6 +335,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Browse Button Click
     browseBtn.addEventListener('click', async () => {
         browsePage = 1; // Reset to page 1
+        browseSeed = Math.floor(Math.random() * 1000000); // Fresh shuffle for each new browse
         await loadBrowseResults();
     });
 
@@ -353,21 +363,8 @@ document.addEventListener('DOMContentLoaded', () => {
         paginationInfo.classList.add('hidden');
 
         try {
-            const response = await fetch('/api/browse', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    language: browseLang,
-                    mood: browseMood,
-                    style: browseStyle,
-                    page: browsePage,
-                    page_size: 10,
-                    sort: browseSort
-                })
-            });
-
-            if (!response.ok) throw new Error('Browse failed');
-            const data = await response.json();
+            const query = currentBrowseQuery();
+            const data = await getBrowsePage(query, browsePage);
 
             if (data.comments && data.comments.length > 0) {
                 data.comments.forEach(obj => {
@@ -408,6 +405,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 // Enable/disable pagination buttons
                 prevPageBtn.disabled = browsePage <= 1;
                 nextPageBtn.disabled = browsePage >= browseTotalPages;
+
+                // Warm the next page while the user reads this one
+                if (data.page < data.total_pages) {
+                    schedulePrefetch(query, data.page + 1);
+                }
             } else {
                 showError('No comments found for this combination.');
             }
@@ -419,6 +421,177 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- Browse Page & Styles Cache ---
+    // Pages live in a bounded in-memory LRU and in IndexedDB, keyed by
+    // filters + seed + page, so pagination, "back" and repeat browses
+    // don't need a round trip.
+
+    const PAGE_CACHE_LIMIT = 50;      // Pages kept in memory
+    const IDB_PAGE_LIMIT = 300;       // Pages kept in IndexedDB
+    const IDB_PAGE_TTL_MS = 60 * 60 * 1000;
+    const PAGE_SIZE = 10;
+    const STYLES_STORAGE_KEY = 'starmaker_styles';
+
+    const pageCache = new Map();      // Insertion order doubles as LRU order
+    const pendingPages = new Map();   // In-flight requests, so prefetch and click share one fetch
+    let pageDbPromise = null;
+
+    function currentBrowseQuery() {
+        return {
+            language: browseLang,
+            mood: browseMood,
+            style: browseStyle,
+            sort: browseSort,
+            // Seed only matters for random order; leaving it out lets alphabetical pages be reused
+            seed: browseSort === 'random' ? browseSeed : null
+        };
+    }
+
+    function pageKey(query, page) {
+        return [query.language, query.mood, query.style, query.sort, query.seed, PAGE_SIZE, page].join('|');
+    }
+
+    function rememberPage(key, data) {
+        pageCache.delete(key);
+        pageCache.set(key, data);
+        while (pageCache.size > PAGE_CACHE_LIMIT) {
+            pageCache.delete(pageCache.keys().next().value);
+        }
+    }
+
+    function openPageDb() {
+        if (pageDbPromise) return pageDbPromise;
+        pageDbPromise = new Promise(resolve => {
+            if (!window.indexedDB) return resolve(null);
+            const request = indexedDB.open('starmaker_cache', 1);
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore('pages', { keyPath: 'key' });
+                store.createIndex('savedAt', 'savedAt');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null); // e.g. private mode; memory cache still works
+        });
+        return pageDbPromise;
+    }
+
+    async function readStoredPage(key) {
+        const db = await openPageDb();
+        if (!db) return null;
+        return new Promise(resolve => {
+            const request = db.transaction('pages', 'readonly').objectStore('pages').get(key);
+            request.onsuccess = () => {
+                const entry = request.result;
+                resolve(entry && Date.now() - entry.savedAt < IDB_PAGE_TTL_MS ? entry.data : null);
+            };
+            request.onerror = () => resolve(null);
+        });
+    }
+
+    async function storePage(key, data) {
+        const db = await openPageDb();
+        if (!db) return;
+        const store = db.transaction('pages', 'readwrite').objectStore('pages');
+        store.put({ key, data, savedAt: Date.now() });
+        const countRequest = store.count();
+        countRequest.onsuccess = () => {
+            let excess = countRequest.result - IDB_PAGE_LIMIT;
+            if (excess <= 0) return;
+            // Drop the oldest entries
+            store.index('savedAt').openCursor().onsuccess = (event) => {
+                const cursor = event.target.result;
+                if (cursor && excess > 0) {
+                    cursor.delete();
+                    excess--;
+                    cursor.continue();
+                }
+            };
+        };
+    }
+
+    async function fetchBrowsePage(query, page) {
+        const response = await fetch('/api/browse', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                language: query.language,
+                mood: query.mood,
+                style: query.style,
+                page: page,
+                page_size: PAGE_SIZE,
+                sort: query.sort,
+                seed: query.seed
+            })
+        });
+        if (!response.ok) throw new Error('Browse failed');
+        return response.json();
+    }
+
+    async function getBrowsePage(query, page) {
+        const key = pageKey(query, page);
+        if (pageCache.has(key)) {
+            const data = pageCache.get(key);
+            rememberPage(key, data);
+            return data;
+        }
+        if (pendingPages.has(key)) return pendingPages.get(key);
+
+        const pending = (async () => {
+            let data = await readStoredPage(key);
+            if (!data) {
+                data = await fetchBrowsePage(query, page);
+                // Don't cache errors or clamped pages (the server returns the last page instead)
+                if (!data.error && data.page === page) storePage(key, data);
+            }
+            if (!data.error && data.page === page) rememberPage(key, data);
+            return data;
+        })();
+        pendingPages.set(key, pending);
+        try {
+            return await pending;
+        } finally {
+            pendingPages.delete(key);
+        }
+    }
+
+    function schedulePrefetch(query, page) {
+        const run = () => getBrowsePage(query, page).catch(() => { /* Prefetch is best effort */ });
+        if (window.requestIdleCallback) {
+            requestIdleCallback(run, { timeout: 1000 });
+        } else {
+            setTimeout(run, 200);
+        }
+    }
+
+    async function fetchStyles() {
+        let stored = null;
+        try {
+            stored = JSON.parse(localStorage.getItem(STYLES_STORAGE_KEY));
+        } catch (e) {
+            stored = null;
+        }
+
+        try {
+            const headers = {};
+            if (stored && stored.etag) headers['If-None-Match'] = stored.etag;
+            const response = await fetch('/api/styles', { headers });
+
+            if (response.status === 304 && stored) return stored.styles;
+            if (!response.ok) throw new Error('Styles failed');
+
+            const data = await response.json();
+            const styles = data.styles || [];
+            const etag = response.headers.get('ETag');
+            if (etag) {
+                localStorage.setItem(STYLES_STORAGE_KEY, JSON.stringify({ etag, styles }));
+            }
+            return styles;
+        } catch (error) {
+            console.error('Failed to load styles:', error);
+            // Offline or server error: fall back to the last known list
+            return stored ? stored.styles : null;
+        }
+    }
+
     // --- Helpers ---
 
     // --- Favorites Logic ---
@@ -0,0 +1,177 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Admission control for CPU-bound endpoints (Smart Search).
+#
+# Two layers:
+#   1. Per-client token buckets: each client may make SEARCH_RATE_PER_SEC
+#      requests per second on average, with bursts up to SEARCH_BURST.
+#   2. A global cap of SEARCH_MAX_CONCURRENT encode/search operations.
+#      Up to SEARCH_MAX_QUEUE further requests wait (at most
+#      SEARCH_QUEUE_TIMEOUT seconds) for a slot; anything beyond is rejected.
+#
+# Rejected requests either fail fast with 429 + Retry-After or, with
+# SEARCH_OVERLOAD_MODE=degrade, are served cheap random samples instead.
+
+SEARCH_RATE_PER_SEC = float(os.getenv("SEARCH_RATE_PER_SEC", 2))
+SEARCH_BURST = float(os.getenv("SEARCH_BURST", 10))
+SEARCH_MAX_CONCURRENT = int(os.getenv("SEARCH_MAX_CONCURRENT", os.cpu_count() or 2))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", 16))
+SEARCH_QUEUE_TIMEOUT = float(os.getenv("SEARCH_QUEUE_TIMEOUT", 2.0))
+SEARCH_OVERLOAD_MODE = os.getenv("SEARCH_OVERLOAD_MODE", "reject").lower()
+
+# Least recently seen clients are forgotten beyond this
+MAX_TRACKED_CLIENTS = 10000
+
+
+class AdmissionRejected(Exception):
+    """Raised by AdmissionController.slot() when no slot could be obtained."""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``rate`` tokens/second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now=None):
+        """
+        Try to take one token.
+        Returns 0 on success, otherwise the seconds until a token is available.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client rate limiting plus a bounded-queue concurrency limiter."""
+
+    def __init__(self, rate=SEARCH_RATE_PER_SEC, burst=SEARCH_BURST,
+                 max_concurrent=SEARCH_MAX_CONCURRENT, max_queue=SEARCH_MAX_QUEUE,
+                 queue_timeout=SEARCH_QUEUE_TIMEOUT):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._buckets = OrderedDict()  # in last-seen order
+        self._buckets_lock = threading.Lock()
+
+        self._slots = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+
+        self.counters = {
+            "admitted": 0,
+            "rate_limited": 0,
+            "queue_full": 0,
+            "queue_timeout": 0,
+            "degraded": 0,
+        }
+
+    # --- Per-client rate limiting ---
+
+    def check_rate(self, client_id):
+        """Returns 0 if the client may proceed, else seconds to wait."""
+        now = time.monotonic()
+        with self._buckets_lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > MAX_TRACKED_CLIENTS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_id)
+            wait = bucket.take(now)
+            if wait:
+                self.counters["rate_limited"] += 1
+            return wait
+
+    # --- Global concurrency cap ---
+
+    def acquire(self):
+        """
+        Wait for a free encode/search slot.
+        Returns False (without waiting) if the queue is full, or after
+        ``queue_timeout`` seconds if no slot became free.
+        """
+        with self._slots:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                self.counters["admitted"] += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.counters["queue_full"] += 1
+                return False
+
+            self.waiting += 1
+            try:
+                got_slot = self._slots.wait_for(lambda: self.active < self.max_concurrent,
+                                                timeout=self.queue_timeout)
+            finally:
+                self.waiting -= 1
+
+            if not got_slot:
+                self.counters["queue_timeout"] += 1
+                return False
+            self.active += 1
+            self.counters["admitted"] += 1
+            return True
+
+    def release(self):
+        with self._slots:
+            self.active -= 1
+            self._slots.notify()
+
+    @contextmanager
+    def slot(self):
+        """acquire()/release() as a context manager; raises AdmissionRejected."""
+        if not self.acquire():
+            raise AdmissionRejected()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def retry_after(self):
+        """Rough hint for clients rejected by the concurrency limiter (seconds)."""
+        return max(1, math.ceil(self.queue_timeout))
+
+    def record_degraded(self):
+        with self._slots:
+            self.counters["degraded"] += 1
+
+    def get_stats(self):
+        with self._slots:
+            stats = dict(self.counters)
+            stats.update({
+                "active": self.active,
+                "queue_depth": self.waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "overload_mode": SEARCH_OVERLOAD_MODE,
+            })
+        with self._buckets_lock:
+            stats["tracked_clients"] = len(self._buckets)
+        return stats
+
+
+search_admission = AdmissionController()
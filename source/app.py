@@ -1,5 +1,7 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+import math
 import os
 import sys
 from dotenv import load_dotenv
@@ -11,16 +13,24 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from gemini_service import generate_comment_gemini, get_usage_stats
+    from gemini_service import generate_comment_gemini, get_usage_stats, get_generation_stats
     from fallback_service import get_fallback_comment
     from smart_search import generate_from_prompt
     from browse_service import get_comments_by_filters, get_all_styles
+    from admission import search_admission, AdmissionRejected, SEARCH_OVERLOAD_MODE
+    import profiling
+    import log_setup
+    import export_service
 except ImportError:
     # Adjust imports for Vercel environment where source is the root
-    from .gemini_service import generate_comment_gemini, get_usage_stats
+    from .gemini_service import generate_comment_gemini, get_usage_stats, get_generation_stats
     from .fallback_service import get_fallback_comment
     from .smart_search import generate_from_prompt
     from .browse_service import get_comments_by_filters, get_all_styles
+    from .admission import search_admission, AdmissionRejected, SEARCH_OVERLOAD_MODE
+    from . import profiling
+    from . import log_setup
+    from . import export_service
 
 # Define paths for templates and static files relative to this file
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../frontend'))
@@ -29,6 +39,17 @@ static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../fronten
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 CORS(app)
 
+# Number of reverse proxies in front of the app whose X-Forwarded-For
+# entries can be trusted. 0 (default) ignores the header entirely, so
+# clients cannot pick their own rate-limit identity.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+log_setup.init_app(app)
+profiling.init_app(app)
+
+logger = log_setup.get_logger("app")
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -44,8 +65,9 @@ def generate_comment():
     
     # Fallback if Gemini fails (e.g. Quota Exceeded)
     if not response_data:
-        print("Gemini API failed. Using fallback service.")
-        response_data = get_fallback_comment(mood, language, context)
+        logger.info("Gemini API failed. Using fallback service.")
+        with profiling.stage("fallback"):
+            response_data = get_fallback_comment(mood, language, context)
     
     if response_data and isinstance(response_data, dict):
         return jsonify({
@@ -73,19 +95,57 @@ def search_comments():
     mood = data.get('mood')
     language = data.get('language')
     
-    # Use the local smart search logic with optional filters
-    results = generate_from_prompt(prompt, mood=mood, language=language, top_k=5)
+    # Per-client rate limit
+    retry_after = search_admission.check_rate(_client_id())
+    if retry_after:
+        return _search_overloaded(prompt, mood, language, retry_after)
+    
+    # Only cache misses need the encoder + FAISS, so the concurrency slot is
+    # taken inside the search; random sampling and cached candidate sets are cheap
+    try:
+        # Use the local smart search logic with optional filters
+        results = generate_from_prompt(prompt, mood=mood, language=language, top_k=5,
+                                       admit=search_admission.slot)
+    except AdmissionRejected:
+        return _search_overloaded(prompt, mood, language, search_admission.retry_after())
     
     return jsonify({
         "results": results,
         "source": "Smart Search (Local)"
     })
 
+def _client_id():
+    """
+    Identify the caller for rate limiting.
+    remote_addr is the client address as seen by the last trusted proxy
+    (see TRUSTED_PROXY_HOPS), never a value the client supplied itself.
+    """
+    return request.remote_addr or 'unknown'
+
+def _search_overloaded(prompt, mood, language, retry_after):
+    """Reject with 429, or serve random samples when SEARCH_OVERLOAD_MODE=degrade."""
+    if SEARCH_OVERLOAD_MODE == 'degrade':
+        search_admission.record_degraded()
+        results = generate_from_prompt(prompt, mood=mood, language=language, top_k=5, semantic=False)
+        return jsonify({
+            "results": results,
+            "source": "Smart Search (Local, degraded)"
+        })
+    
+    retry_seconds = max(1, math.ceil(retry_after))
+    response = jsonify({
+        "error": "Too many search requests. Please try again shortly.",
+        "retry_after": retry_seconds
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_seconds)
+    return response
+
 @app.route('/api/browse', methods=['POST'])
 def browse_comments():
     """
     Endpoint for Browse Mode
-    Accepts: language, mood, style (optional), page, page_size, sort
+    Accepts: language, mood, style (optional), page, page_size, sort, seed (optional)
     """
     data = request.json
     if not data:
@@ -97,6 +157,9 @@ def browse_comments():
     page = data.get('page', 1)
     page_size = data.get('page_size', 10)
     sort = data.get('sort', 'random')
+    seed = data.get('seed')
+    if not isinstance(seed, int) or isinstance(seed, bool) or not 0 <= seed < 2**32:
+        seed = None
     
     result = get_comments_by_filters(
         language=language,
@@ -104,18 +167,89 @@ def browse_comments():
         style=style,
         page=page,
         page_size=page_size,
-        sort=sort
+        sort=sort,
+        seed=seed
     )
     
     return jsonify(result)
 
+@app.route('/api/export', methods=['GET'])
+def export_comments():
+    """
+    Endpoint for bulk export (streamed, chunked)
+    Accepts query params: language, mood, style (all optional; omit for the whole corpus),
+    format ('ndjson' or 'csv'), embeddings (1 to add a "row" index into /api/export/embeddings)
+    """
+    language = request.args.get('language')
+    mood = request.args.get('mood')
+    style = request.args.get('style')
+    export_format = request.args.get('format', 'ndjson').lower()
+    include_row = request.args.get('embeddings', '').lower() in ('1', 'true', 'yes')
+
+    if export_format not in export_service.EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format: {export_format}"}), 400
+
+    positions = export_service.select_rows(language, mood, style)
+    if positions is None:
+        return jsonify({"error": "Dataset not loaded"}), 503
+
+    if export_format == 'csv':
+        body, mimetype = export_service.iter_csv(positions, include_row), 'text/csv'
+    else:
+        body, mimetype = export_service.iter_ndjson(positions, include_row), 'application/x-ndjson'
+
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{export_service.export_filename(language, mood, style, export_format)}"'
+    )
+    response.headers['X-Total-Count'] = str(len(positions))
+    return response
+
+@app.route('/api/export/embeddings', methods=['GET'])
+def export_embeddings():
+    """
+    Binary sidecar for /api/export: the same rows' embeddings as a float32 .npy
+    Accepts query params: language, mood, style (same as /api/export)
+    """
+    language = request.args.get('language')
+    mood = request.args.get('mood')
+    style = request.args.get('style')
+
+    positions = export_service.select_rows(language, mood, style)
+    if positions is None:
+        return jsonify({"error": "Dataset not loaded"}), 503
+
+    try:
+        body = export_service.iter_embeddings_npy(positions)
+    except Exception as e:
+        logger.error(f"Embeddings export unavailable: {e}")
+        return jsonify({"error": "Embeddings not available"}), 503
+
+    response = Response(body, mimetype='application/octet-stream')
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{export_service.export_filename(language, mood, style, "npy")}"'
+    )
+    response.headers['X-Total-Count'] = str(len(positions))
+    return response
+
 @app.route('/api/styles', methods=['GET'])
 def get_styles():
     """
     Endpoint to get all unique styles
     """
     styles = get_all_styles()
-    return jsonify({"styles": styles})
+    response = jsonify({"styles": styles})
+    # Clients revalidate with If-None-Match and get a 304 when unchanged
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/admission', methods=['GET'])
+def api_admission():
+    """
+    Endpoint to monitor search admission control (queue depth, rejections)
+    """
+    return jsonify(search_admission.get_stats())
 
 @app.route('/api/usage', methods=['GET'])
 def api_usage():
@@ -123,6 +257,8 @@ def api_usage():
     Endpoint to get AI query usage stats
     """
     stats = get_usage_stats()
+    stats["generation"] = get_generation_stats()
+    stats["logging"] = {"dropped_records": log_setup.dropped_records()}
     return jsonify(stats)
 
 if __name__ == '__main__':
@@ -1,6 +1,15 @@
 import os
 import random
 
+try:
+    from profiling import stage
+    from log_setup import get_logger
+except ImportError:
+    from .profiling import stage
+    from .log_setup import get_logger
+
+logger = get_logger("browse_service")
+
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_FILE = os.path.abspath(os.path.join(SCRIPT_DIR, '../dataset/comments.json'))
@@ -17,18 +26,18 @@ def load_data():
             import pandas as pd_module
             pd = pd_module
         except ImportError:
-            print("Browse Service: pandas not found. Browsing disabled.")
+            logger.warning("Browse Service: pandas not found. Browsing disabled.")
             return
 
     if DF is None and os.path.exists(DATA_FILE):
         try:
-            print("Loading dataset for browse...")
+            logger.info("Loading dataset for browse...")
             DF = pd.read_json(DATA_FILE)
-            print(f"Loaded {len(DF)} comments.")
+            logger.info(f"Loaded {len(DF)} comments.")
         except Exception as e:
-            print(f"Error loading dataset: {e}")
+            logger.error(f"Error loading dataset: {e}")
 
-def get_comments_by_filters(language, mood, style=None, page=1, page_size=10, sort='random'):
+def get_comments_by_filters(language, mood, style=None, page=1, page_size=10, sort='random', seed=None):
     """
     Fetch comments by language, mood, and optionally style.
     Supports pagination and sorting.
@@ -40,16 +49,20 @@ def get_comments_by_filters(language, mood, style=None, page=1, page_size=10, so
         page: Page number (1-indexed)
         page_size: Number of results per page
         sort: 'alphabetical' or 'random'
+        seed: Shuffle seed for 'random' sort; reusing it keeps the order
+              stable across pages (a new one is picked if omitted)
     
     Returns:
         {
             'comments': [...],
             'total': total_count,
             'page': current_page,
-            'total_pages': total_pages
+            'total_pages': total_pages,
+            'seed': seed
         }
     """
-    load_data()
+    with stage("load_data"):
+        load_data()
     
     if DF is None:
         return {
@@ -61,14 +74,15 @@ def get_comments_by_filters(language, mood, style=None, page=1, page_size=10, so
         }
     
     # Filter by language and mood
-    filtered_df = DF[
-        (DF["language"].str.lower() == language.lower()) &
-        (DF["mood"].str.lower() == mood.lower())
-    ]
-    
-    # Optionally filter by style
-    if style and style.lower() != 'all':
-        filtered_df = filtered_df[filtered_df["style"].str.lower() == style.lower()]
+    with stage("filter"):
+        filtered_df = DF[
+            (DF["language"].str.lower() == language.lower()) &
+            (DF["mood"].str.lower() == mood.lower())
+        ]
+        
+        # Optionally filter by style
+        if style and style.lower() != 'all':
+            filtered_df = filtered_df[filtered_df["style"].str.lower() == style.lower()]
     
     total_count = len(filtered_df)
     
@@ -81,10 +95,13 @@ def get_comments_by_filters(language, mood, style=None, page=1, page_size=10, so
         }
     
     # Apply sorting
-    if sort == 'alphabetical':
-        filtered_df = filtered_df.sort_values(by='text')
-    elif sort == 'random':
-        filtered_df = filtered_df.sample(frac=1, random_state=random.randint(1, 10000))
+    with stage("sort"):
+        if sort == 'alphabetical':
+            filtered_df = filtered_df.sort_values(by='text')
+        elif sort == 'random':
+            if seed is None:
+                seed = random.randint(1, 10000)
+            filtered_df = filtered_df.sample(frac=1, random_state=seed)
     
     # Pagination
     total_pages = (total_count + page_size - 1) // page_size
@@ -105,7 +122,8 @@ def get_comments_by_filters(language, mood, style=None, page=1, page_size=10, so
         'comments': comments,
         'total': total_count,
         'page': page,
-        'total_pages': total_pages
+        'total_pages': total_pages,
+        'seed': seed
     }
 
 def get_all_styles():
@@ -0,0 +1,209 @@
+"""
+Export, validate and benchmark the ONNX query encoder.
+
+    python export_onnx.py export [--quantize]
+    python export_onnx.py validate [--backend onnx|onnx-int8] [--samples 256] [--tolerance 0.01]
+    python export_onnx.py benchmark [--backends torch onnx onnx-int8] [--queries 200]
+
+`export` needs torch + transformers (run it once, where prepare_data.py runs).
+`validate` and `benchmark` compare against dataset/embeddings.npy, which
+prepare_data.py produces with the reference sentence-transformers model.
+"""
+import argparse
+import inspect
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from query_encoder import (
+    HF_MODEL_ID, ONNX_DIR, ONNX_MODEL_FILE, ONNX_QUANTIZED_MODEL_FILE,
+    TOKENIZER_FILE, create_encoder
+)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILE = os.path.abspath(os.path.join(SCRIPT_DIR, '../dataset/comments.json'))
+EMBEDDINGS_FILE = os.path.abspath(os.path.join(SCRIPT_DIR, '../dataset/embeddings.npy'))
+
+# Short prompts like the ones users type into Smart Search
+BENCHMARK_QUERIES = [
+    "sunset by the river",
+    "old memories of childhood",
+    "gym motivation",
+    "rainy evening love song",
+    "bangla gaan for durga puja",
+    "devotional morning prayer",
+    "sad breakup song that made me cry",
+    "amazing high notes in the chorus",
+]
+
+
+def export(quantize):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(ONNX_DIR, exist_ok=True)
+    print(f"Loading {HF_MODEL_ID}...")
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+    model = AutoModel.from_pretrained(HF_MODEL_ID)
+    model.eval()
+
+    class LastHiddenState(torch.nn.Module):
+        """Fixed keyword call into the transformer; its positional signature varies by version."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    model_path = os.path.join(ONNX_DIR, ONNX_MODEL_FILE)
+    print(f"Exporting to {model_path}...")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ("input_ids", "attention_mask", "token_type_ids")}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    # torch >= 2.9 defaults to the dynamo exporter (needs onnxscript); keep the TorchScript one
+    export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(model),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            model_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            **export_kwargs
+        )
+
+    tokenizer_path = os.path.join(ONNX_DIR, TOKENIZER_FILE)
+    tokenizer.backend_tokenizer.save(tokenizer_path)
+    print(f"Saved tokenizer to {tokenizer_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(ONNX_DIR, ONNX_QUANTIZED_MODEL_FILE)
+        print(f"Quantizing to {quantized_path}...")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+
+    print("Done!")
+
+
+def validate(backend, samples, tolerance, seed=0):
+    """Compare encoder output to the stored corpus embeddings (cosine similarity)."""
+    import numpy as np
+
+    with open(DATA_FILE, 'r', encoding='utf-8') as f:
+        comments = json.load(f)
+    reference = np.load(EMBEDDINGS_FILE)
+
+    rows = random.Random(seed).sample(range(len(comments)), min(samples, len(comments)))
+    texts = [comments[i]['text'] for i in rows]
+
+    encoder = create_encoder(backend)
+    produced = np.vstack([encoder.encode(texts[i:i + 32]) for i in range(0, len(texts), 32)])
+    expected = reference[rows]
+
+    produced = produced / np.linalg.norm(produced, axis=1, keepdims=True)
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    cosine = (produced * expected).sum(axis=1)
+    worst = float(cosine.min())
+
+    print(f"Backend:          {encoder.name}")
+    print(f"Rows compared:    {len(rows)}")
+    print(f"Cosine mean/min:  {float(cosine.mean()):.5f} / {worst:.5f}")
+    print(f"Max abs diff:     {float(np.abs(produced - expected).max()):.5f}")
+
+    passed = worst >= 1 - tolerance
+    print(f"Result:           {'PASS' if passed else 'FAIL'} (tolerance {tolerance})")
+    return passed
+
+
+def _max_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def benchmark_one(backend, queries):
+    """Measure a single backend in this process and print a JSON line."""
+    baseline_rss = _max_rss_mb()
+    started = time.perf_counter()
+    encoder = create_encoder(backend)
+    encoder.encode([BENCHMARK_QUERIES[0]])  # Warm-up
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for i in range(queries):
+        query = BENCHMARK_QUERIES[i % len(BENCHMARK_QUERIES)]
+        t0 = time.perf_counter()
+        encoder.encode([query])
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+
+    print(json.dumps({
+        "backend": encoder.name,
+        "load_s": round(load_seconds, 3),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "rss_mb": round(_max_rss_mb() - baseline_rss, 1),
+    }))
+
+
+def benchmark(backends, queries):
+    """Run each backend in a fresh subprocess so memory numbers don't mix."""
+    print(f"{'backend':<12}{'load s':>9}{'p50 ms':>9}{'p95 ms':>9}{'RSS MB':>9}")
+    for backend in backends:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_bench_one", "--backend", backend, "--queries", str(queries)],
+            capture_output=True, text=True
+        )
+        # JSON log lines also go to stdout; keep only the result line
+        lines = [l for l in proc.stdout.splitlines() if l.startswith('{"backend"')]
+        if proc.returncode != 0 or not lines:
+            print(f"{backend:<12} failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'no output'}")
+            continue
+        r = json.loads(lines[-1])
+        print(f"{r['backend']:<12}{r['load_s']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['rss_mb']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX query encoder tooling.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="Export the model to ONNX")
+    p_export.add_argument("--quantize", action="store_true", help="Also write an int8-quantized model")
+
+    p_validate = sub.add_parser("validate", help="Check embeddings against dataset/embeddings.npy")
+    p_validate.add_argument("--backend", default="onnx")
+    p_validate.add_argument("--samples", type=int, default=256)
+    p_validate.add_argument("--tolerance", type=float, default=0.01, help="Allowed 1 - cosine similarity")
+
+    p_bench = sub.add_parser("benchmark", help="Compare latency and memory of backends")
+    p_bench.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    p_bench.add_argument("--queries", type=int, default=200)
+
+    p_one = sub.add_parser("_bench_one")
+    p_one.add_argument("--backend", required=True)
+    p_one.add_argument("--queries", type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.quantize)
+    elif args.command == "validate":
+        sys.exit(0 if validate(args.backend, args.samples, args.tolerance) else 1)
+    elif args.command == "benchmark":
+        benchmark(args.backends, args.queries)
+    elif args.command == "_bench_one":
+        benchmark_one(args.backend, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import os
+import re
+
+try:
+    import browse_service
+    from log_setup import get_logger
+except ImportError:
+    from . import browse_service
+    from .log_setup import get_logger
+
+logger = get_logger("export_service")
+
+# Streaming bulk export of comment partitions.
+#
+# Rows are written in dataset order, CHUNK_ROWS at a time, so memory use
+# does not grow with the size of the partition. The optional embeddings
+# sidecar is a .npy file streamed from a memory-mapped embeddings.npy in
+# the same row order; NDJSON/CSV rows then carry a "row" column giving
+# their index into it.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDINGS_FILE = os.path.abspath(os.path.join(SCRIPT_DIR, '../dataset/embeddings.npy'))
+
+CHUNK_ROWS = 500
+EXPORT_COLUMNS = ['id', 'text', 'language', 'mood', 'style', 'intensity', 'emoji_level']
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+
+def _is_set(value):
+    return bool(value) and value.lower() != 'all'
+
+
+def select_rows(language=None, mood=None, style=None):
+    """
+    Positions of the rows matching the filters, in dataset order.
+    Any filter that is empty or 'all' is ignored, so no filters = whole corpus.
+    Returns None if the dataset is not available.
+    """
+    browse_service.load_data()
+    df = browse_service.DF
+    if df is None:
+        return None
+
+    mask = None
+    for column, value in (('language', language), ('mood', mood), ('style', style)):
+        if _is_set(value) and column in df.columns:
+            condition = df[column].str.lower() == value.lower()
+            mask = condition if mask is None else mask & condition
+
+    if mask is None:
+        return range(len(df))
+    return mask.to_numpy().nonzero()[0]
+
+
+def _columns(df, include_row):
+    columns = [c for c in EXPORT_COLUMNS if c in df.columns]
+    return (['row'] if include_row else []) + columns
+
+
+def _chunks(positions):
+    for start in range(0, len(positions), CHUNK_ROWS):
+        yield start, positions[start:start + CHUNK_ROWS]
+
+
+def iter_ndjson(positions, include_row=False):
+    """One JSON object per line."""
+    df = browse_service.DF
+    columns = _columns(df, include_row)
+    data_columns = [c for c in columns if c != 'row']
+
+    for start, chunk in _chunks(positions):
+        records = df.iloc[chunk][data_columns].to_dict('records')
+        lines = []
+        for offset, record in enumerate(records):
+            if include_row:
+                record = {'row': start + offset, **record}
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        yield "\n".join(lines) + "\n"
+
+
+def iter_csv(positions, include_row=False):
+    """CSV with a header row."""
+    df = browse_service.DF
+    columns = _columns(df, include_row)
+    data_columns = [c for c in columns if c != 'row']
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    for start, chunk in _chunks(positions):
+        buffer.seek(0)
+        buffer.truncate()
+        for offset, values in enumerate(df.iloc[chunk][data_columns].itertuples(index=False, name=None)):
+            writer.writerow(([start + offset] if include_row else []) + list(values))
+        yield buffer.getvalue()
+
+
+def iter_embeddings_npy(positions):
+    """
+    The embeddings of the selected rows as a float32 .npy file
+    (loadable with numpy.load), streamed without materialising the matrix.
+    Raises if the embeddings file is missing, before anything is yielded.
+    """
+    import numpy as np
+
+    embeddings = np.load(EMBEDDINGS_FILE, mmap_mode='r')
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype('<f4')),
+        'fortran_order': False,
+        'shape': (len(positions), embeddings.shape[1]),
+    })
+
+    def generate():
+        yield header.getvalue()
+        for _, chunk in _chunks(positions):
+            yield np.ascontiguousarray(embeddings[chunk], dtype='<f4').tobytes()
+
+    return generate()
+
+
+def export_filename(language, mood, style, extension):
+    """Download name for Content-Disposition; filter values are reduced to [a-z0-9_-]."""
+    parts = [re.sub(r'[^a-z0-9_-]+', '_', value.lower()).strip('_')
+             for value in (language, mood, style) if _is_set(value)]
+    return f"comments_{'_'.join(p for p in parts if p) or 'all'}.{extension}"
@@ -3,6 +3,15 @@ import random
 import os
 import numpy as np
 
+try:
+    from query_encoder import get_encoder
+    from log_setup import get_logger
+except ImportError:
+    from .query_encoder import get_encoder
+    from .log_setup import get_logger
+
+logger = get_logger("fallback_service")
+
 # Path configurations
 # source/fallback_service.py
 # dataset/comments.json
@@ -21,31 +30,24 @@ def load_data():
         try:
             with open(DATA_FILE, 'r', encoding='utf-8') as f:
                 COMMENTS_DATA = json.load(f)
-            print(f"Loaded {len(COMMENTS_DATA)} comments.")
+            logger.info(f"Loaded {len(COMMENTS_DATA)} comments.")
         except Exception as e:
-            print(f"Error loading comments data: {e}")
+            logger.error(f"Error loading comments data: {e}")
     elif not os.path.exists(DATA_FILE):
-        print(f"Data file not found at: {DATA_FILE}")
+        logger.error(f"Data file not found at: {DATA_FILE}")
 
     if EMBEDDINGS_DATA is None and os.path.exists(EMBEDDINGS_FILE):
         try:
             EMBEDDINGS_DATA = np.load(EMBEDDINGS_FILE)
-            print(f"Loaded embeddings shape: {EMBEDDINGS_DATA.shape}")
+            logger.info(f"Loaded embeddings shape: {EMBEDDINGS_DATA.shape}")
         except Exception as e:
-            print(f"Error loading embeddings: {e}")
+            logger.error(f"Error loading embeddings: {e}")
 
-    # Try to load SentenceTransformer if possible, but don't crash if it fails (Vercel limits)
+    # Try to load the query encoder if possible, but don't crash if it fails (Vercel limits)
+    # ENCODER_BACKEND=onnx avoids importing torch entirely.
+    # (get_encoder logs the failure and backs off before retrying.)
     if MODEL is None:
-        try:
-            from sentence_transformers import SentenceTransformer
-            # Using a very small model or relying on pre-computed if we can't load a full model
-            # For Vercel, this might fail due to size. 
-            # We will use a try-except block to gracefully degrade.
-            MODEL = SentenceTransformer('all-MiniLM-L6-v2') 
-        except ImportError:
-            print("sentence-transformers not installed or failed to load. Semantic search disabled.")
-        except Exception as e:
-            print(f"Error loading SentenceTransformer: {e}")
+        MODEL = get_encoder()
 
 def get_fallback_comment(mood, language, context=None):
     """
@@ -103,7 +105,7 @@ def get_fallback_comment(mood, language, context=None):
                 }
                 
         except Exception as e:
-            print(f"Semantic search failed: {e}")
+            logger.warning(f"Semantic search failed: {e}")
             # Fallback to random
             
     # 3. Random Selection (Default Fallback)
@@ -1,29 +1,116 @@
 from google import genai
 from google.genai import types
+import math
 import os
 import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, date
 
+try:
+    from profiling import stage
+    from log_setup import get_logger
+except ImportError:
+    from .profiling import stage
+    from .log_setup import get_logger
+
+logger = get_logger("gemini_service")
+
 # Configure Gemini API
 API_KEY = os.getenv("GEMINI_API_KEY")
 client = None
 
 if API_KEY:
-    print(f"DEBUG: Loaded Gemini API Key starting with: {API_KEY[:5]}...")
+    logger.debug(f"Loaded Gemini API Key starting with: {API_KEY[:5]}...")
     client = genai.Client(api_key=API_KEY)
 else:
-    print("DEBUG: No Gemini API Key found in environment variables.")
+    logger.warning("No Gemini API Key found in environment variables.")
 
 MODEL_NAME = "gemini-2.5-flash-lite"
 
+# Generation backend: "gemini" (default) or "local" (see local_backend.py)
+GENERATION_BACKEND = os.getenv("GENERATION_BACKEND", "gemini").lower()
+
+
+class GenerationBackend:
+    """
+    Interface for anything that can answer a batch generation prompt.
+
+    ``plan`` is the list of batches the prompt asks for, each a dict with
+    "mood", "language", "context" and "count". Implementations return the
+    raw response text (expected to be JSON) and raise on API errors.
+    """
+    name = "base"
+    counts_quota = True  # Whether successful calls count against DAILY_LIMIT
+
+    def generate(self, prompt, config, plan):
+        raise NotImplementedError
+
+
+class GeminiBackend(GenerationBackend):
+    """Calls the real Gemini API through the google-genai client."""
+    name = "gemini"
+
+    def __init__(self, genai_client):
+        self.client = genai_client
+
+    def generate(self, prompt, config, plan):
+        response = self.client.models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt,
+            config=config
+        )
+        return response.text
+
+
+def _create_backend():
+    """Build the backend selected by GENERATION_BACKEND."""
+    if GENERATION_BACKEND == "local":
+        try:
+            from local_backend import LocalBackend
+        except ImportError:
+            from .local_backend import LocalBackend
+        logger.info("Using local generation backend (no Gemini quota used).")
+        return LocalBackend()
+    if client:
+        return GeminiBackend(client)
+    return None
+
+backend = _create_backend()
+
+MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", 2000))
+
 # Generation Config
 generate_config = types.GenerateContentConfig(
     temperature=1.0,
     top_p=0.95,
     top_k=64,
-    max_output_tokens=2000, # Increased for batch output
+    max_output_tokens=MAX_OUTPUT_TOKENS, # Increased for batch output
 )
 
+# Batch Planner
+# Each Gemini call counts against DAILY_LIMIT no matter how many comments it
+# returns, so the planner sizes batches from observed demand and packs
+# several hot (mood, language) keys into one call, up to what fits in
+# MAX_OUTPUT_TOKENS.
+MIN_BATCH_SIZE = 5
+MAX_BATCH_SIZE = int(os.getenv("GEMINI_MAX_BATCH_SIZE", 25))
+MAX_KEYS_PER_CALL = int(os.getenv("GEMINI_MAX_KEYS_PER_CALL", 4))
+DEMAND_HALF_LIFE = 600.0   # seconds; demand score ~ requests in the last ~15 min
+HOT_KEY_MIN_DEMAND = 2.0   # keys below this are never packed into other calls
+LOW_WATERMARK = 2          # packed keys are refilled once their pool drops below this
+IN_FLIGHT_WAIT = float(os.getenv("GEMINI_IN_FLIGHT_WAIT", 30))  # max seconds to wait on another request's call
+MAX_TRACKED_KEYS = 1000          # least recently requested keys are evicted beyond this
+
+# Rough output cost of one comment object, per language (Bangla script
+# tokenizes much less densely than English). Only TOKEN_BUDGET_FRACTION of
+# MAX_OUTPUT_TOKENS is planned for so batches aren't cut off mid-JSON.
+TOKENS_PER_COMMENT = {"english": 90, "bengali": 220}
+DEFAULT_TOKENS_PER_COMMENT = 150
+TOKENS_PER_BATCH_OVERHEAD = 20
+TOKEN_BUDGET_FRACTION = 0.8
+
 import json
 
 # Daily Query Tracking
@@ -44,7 +131,7 @@ def _save_usage():
         with open(USAGE_FILE, 'w') as f:
             json.dump(data, f)
     except Exception as e:
-        print(f"Error saving usage data: {e}")
+        logger.error(f"Error saving usage data: {e}")
 
 def _load_usage():
     """Load usage data from file."""
@@ -57,7 +144,7 @@ def _load_usage():
                 query_count = data.get("count", 0)
                 query_date = saved_date
         except Exception as e:
-            print(f"Error loading usage data: {e}")
+            logger.error(f"Error loading usage data: {e}")
 
 # Load on module import
 _load_usage()
@@ -66,6 +153,36 @@ _load_usage()
 # Format: {(mood, language, context): [list_of_comments]}
 COMMENT_CACHE = {}
 
+# Counters for cache/backend behaviour (read by /api/usage and load_test.py)
+GENERATION_STATS = {
+    "cache_hits": 0,
+    "cache_misses": 0,
+    "backend_calls": 0,
+    "backend_errors": 0,
+    "malformed_responses": 0,
+    "comments_generated": 0,
+    "dropped_items": 0,
+    "packed_keys": 0,
+    "coalesced_waits": 0,
+}
+
+# Decayed request counts per cache key: {(mood, language, context): (score, last_seen)}
+# Ordered by last request (LRU), capped at MAX_TRACKED_KEYS.
+DEMAND = OrderedDict()
+
+# Keys with a generation call in progress: {(mood, language, context): Event set when it finishes}.
+# A miss on one of these waits for that call instead of starting another.
+IN_FLIGHT = {}
+
+# Guards COMMENT_CACHE, DEMAND and IN_FLIGHT, which request threads share
+_cache_lock = threading.Lock()
+# Guards GENERATION_STATS and the daily quota counter
+_stats_lock = threading.Lock()
+
+def _count(stat, n=1):
+    with _stats_lock:
+        GENERATION_STATS[stat] += n
+
 def _reset_if_new_day():
     """Reset counter if it's a new day."""
     global query_count, query_date
@@ -77,18 +194,31 @@ def _reset_if_new_day():
 
 def get_usage_stats():
     """Get current API usage statistics."""
-    _reset_if_new_day()
-    return {
-        "used": query_count,
-        "remaining": max(0, DAILY_LIMIT - query_count),
-        "total": DAILY_LIMIT,
-        "date": query_date.isoformat()
-    }
+    with _stats_lock:
+        _reset_if_new_day()
+        return {
+            "used": query_count,
+            "remaining": max(0, DAILY_LIMIT - query_count),
+            "total": DAILY_LIMIT,
+            "date": query_date.isoformat()
+        }
+
+def get_generation_stats():
+    """Get cache and backend counters for the generation path."""
+    with _stats_lock:
+        stats = dict(GENERATION_STATS)
+    stats["backend"] = backend.name if backend else None
+    with _cache_lock:
+        stats["cached_keys"] = len(COMMENT_CACHE)
+        stats["cached_comments"] = sum(len(v) for v in COMMENT_CACHE.values())
+    successful_calls = stats["backend_calls"] - stats["backend_errors"] - stats["malformed_responses"]
+    stats["comments_per_call"] = round(stats["comments_generated"] / successful_calls, 2) if successful_calls > 0 else 0
+    return stats
 
 # System instruction to set the AI persona
 SYSTEM_INSTRUCTION = """You are a music lover who writes engaging, personal, and heartfelt comments on songs, music videos, and artist pages.
 
-Your task is to generate 5 DIFFERENT, UNIQUE comments based on the user's request.
+Your task is to generate the requested number of DIFFERENT, UNIQUE comments based on the user's request.
 
 Each comment must be:
 - About music, songs, artists, melodies, lyrics, or the listening experience
@@ -98,7 +228,7 @@ Each comment must be:
 - Share a personal experience related to listening to the song/music
 
 Output Format:
-You MUST return a JSON Object with a single key "comments" which is a LIST of 5 objects.
+You MUST return a JSON Object with a single key "comments" which is a LIST of the requested number of objects.
 Each object in the list must have:
 - "comment": The text
 - "mood": The mood
@@ -114,6 +244,22 @@ Example JSON Structure:
 }
 """
 
+# Used when several (mood, language) keys are packed into one call
+BATCH_SYSTEM_INSTRUCTION = SYSTEM_INSTRUCTION.split("Output Format:")[0] + """Output Format:
+The user lists several numbered requests. You MUST return a JSON Object with a single key "batches",
+a LIST with one entry per request, in order. Each entry must have:
+- "request": The request number
+- "comments": A LIST of the requested number of objects, each with "comment", "mood" and "style"
+
+Example JSON Structure:
+{
+  "batches": [
+    {"request": 1, "comments": [{"comment": "...", "mood": "...", "style": "..."}, ...]},
+    {"request": 2, "comments": [{"comment": "...", "mood": "...", "style": "..."}, ...]}
+  ]
+}
+"""
+
 MOOD_PROMPTS = {
     # ... (same as before) ...
     "romantic": "Write a romantic comment about how this song makes you feel in love.",
@@ -133,98 +279,259 @@ MOOD_PROMPTS = {
     "inspirational": "Write an inspiring comment about how this song motivates you.",
 }
 
+def _tokens_per_comment(language):
+    return TOKENS_PER_COMMENT.get((language or "").lower(), DEFAULT_TOKENS_PER_COMMENT)
+
+def _record_demand(key, now):
+    """Caller holds _cache_lock."""
+    score = _demand(key, now) + 1
+    DEMAND[key] = (score, now)
+    DEMAND.move_to_end(key)
+    while len(DEMAND) > MAX_TRACKED_KEYS:
+        DEMAND.popitem(last=False)
+
+def _demand(key, now):
+    score, last_seen = DEMAND.get(key, (0.0, now))
+    return score * 0.5 ** ((now - last_seen) / DEMAND_HALF_LIFE)
+
+def _batch_size_for(key, now, token_budget):
+    """Comments to request for a key: its recent demand, within [MIN_BATCH_SIZE, MAX_BATCH_SIZE] and the budget."""
+    wanted = min(MAX_BATCH_SIZE, max(MIN_BATCH_SIZE, math.ceil(_demand(key, now))))
+    affordable = (token_budget - TOKENS_PER_BATCH_OVERHEAD) // _tokens_per_comment(key[1])
+    return int(min(wanted, affordable))
+
+def plan_batch(cache_key, now):
+    """
+    Decide what one generation call should ask for (caller holds _cache_lock).
+    The requested key always comes first; hot context-free keys whose pools
+    are running low, and that no other call is already fetching, are packed
+    in while the output token budget allows.
+    Returns a list of {"key", "mood", "language", "context", "count"} entries.
+    """
+    budget = int(MAX_OUTPUT_TOKENS * TOKEN_BUDGET_FRACTION)
+
+    count = max(1, _batch_size_for(cache_key, now, budget))
+    mood, language, context = cache_key
+    plan = [{"key": cache_key, "mood": mood, "language": language, "context": context, "count": count}]
+    budget -= TOKENS_PER_BATCH_OVERHEAD + count * _tokens_per_comment(language)
+
+    hot_keys = sorted(
+        (k for k in DEMAND
+         if k != cache_key and not k[2] and k not in IN_FLIGHT
+         and len(COMMENT_CACHE.get(k, [])) < LOW_WATERMARK
+         and _demand(k, now) >= HOT_KEY_MIN_DEMAND),
+        key=lambda k: -_demand(k, now)
+    )
+    for key in hot_keys:
+        if len(plan) >= MAX_KEYS_PER_CALL:
+            break
+        count = _batch_size_for(key, now, budget)
+        if count < MIN_BATCH_SIZE:
+            continue
+        plan.append({"key": key, "mood": key[0], "language": key[1], "context": key[2], "count": count})
+        budget -= TOKENS_PER_BATCH_OVERHEAD + count * _tokens_per_comment(key[1])
+    return plan
+
+def _request_text(entry):
+    mood_instruction = MOOD_PROMPTS.get(entry["mood"].lower(), "Write an engaging comment.")
+    
+    lang_instruction = ""
+    if entry["language"].lower() == "bengali":
+        lang_instruction = "Write in Bengali (Bangla script)."
+    else:
+        lang_instruction = "Write in English."
+
+    context_part = ""
+    if entry["context"]:
+        context_part = f"\nTopic: {entry['context']}"
+
+    return f"{mood_instruction} {lang_instruction}{context_part}"
+
+def build_prompt(plan):
+    """Returns (prompt, system_instruction) for a plan from plan_batch()."""
+    if len(plan) == 1:
+        entry = plan[0]
+        prompt = f"""{_request_text(entry)}
+
+Generate {entry["count"]} distinct comments in the requested style.
+Ensure they are varied in tone and wording.
+Return ONLY the JSON object with the "comments" list.
+"""
+        return prompt, SYSTEM_INSTRUCTION
+
+    sections = []
+    for i, entry in enumerate(plan, start=1):
+        sections.append(f"Request {i}: {_request_text(entry)}\nGenerate {entry['count']} distinct comments for this request.")
+    prompt = "\n\n".join(sections) + """
+
+Ensure the comments are varied in tone and wording.
+Return ONLY the JSON object with the "batches" list, one entry per request.
+"""
+    return prompt, BATCH_SYSTEM_INSTRUCTION
+
+def _validate_comment(item, entry):
+    """Normalize one generated item, or return None if it is unusable."""
+    if not isinstance(item, dict):
+        return None
+    norm_item = {str(k).lower(): v for k, v in item.items()}
+    comment = norm_item.get("comment")
+    if not isinstance(comment, str) or len(comment.strip()) < 10:
+        return None
+    norm_item["comment"] = comment.strip()
+    if not isinstance(norm_item.get("mood"), str) or not norm_item["mood"].strip():
+        norm_item["mood"] = entry["mood"]
+    if not isinstance(norm_item.get("style"), str) or not norm_item["style"].strip():
+        norm_item["style"] = "General"
+    return norm_item
+
+def split_response(result_json, plan):
+    """
+    Map a parsed response back onto the plan.
+    Returns one list of validated comments per plan entry; malformed items
+    are dropped and counted.
+    """
+    if not isinstance(result_json, dict):
+        return [[] for _ in plan]
+
+    raw_lists = [[] for _ in plan]
+    if "batches" in result_json and isinstance(result_json["batches"], list):
+        for position, batch in enumerate(result_json["batches"]):
+            if not isinstance(batch, dict):
+                continue
+            index = batch.get("request", position + 1)
+            index = index - 1 if isinstance(index, int) and 1 <= index <= len(plan) else position
+            if index < len(plan) and isinstance(batch.get("comments"), list):
+                raw_lists[index].extend(batch["comments"])
+    elif isinstance(result_json.get("comments"), list):
+        raw_lists[0] = result_json["comments"]
+
+    results = []
+    for entry, raw in zip(plan, raw_lists):
+        valid = []
+        seen = set()
+        for item in raw:
+            comment = _validate_comment(item, entry)
+            if comment is None or comment["comment"] in seen:
+                _count("dropped_items")
+                continue
+            seen.add(comment["comment"])
+            valid.append(comment)
+        results.append(valid)
+    return results
+
 def generate_comment_gemini(mood, language, context=None):
     """
     Generates a comment using Gemini API with Batching and Caching.
+    Batch size and packing of other hot keys are decided by plan_batch().
     """
     global query_count, COMMENT_CACHE
     
-    if not client:
-        print("Gemini API Client not initialized.")
+    if not backend:
+        logger.warning("Gemini API Client not initialized.")
         return None
 
     # 1. Check Cache
     cache_key = (mood, language, context)
-    if cache_key in COMMENT_CACHE and COMMENT_CACHE[cache_key]:
-        print("DEBUG: Serving comment from CACHE.")
-        return COMMENT_CACHE[cache_key].pop(0)
-
-    try:
-        print("DEBUG: Cache miss. Fetching new batch from Gemini.")
-        mood_instruction = MOOD_PROMPTS.get(mood.lower(), "Write an engaging comment.")
-        
-        lang_instruction = ""
-        if language.lower() == "bengali":
-            lang_instruction = "Write in Bengali (Bangla script)."
-        else:
-            lang_instruction = "Write in English."
+    with _cache_lock:
+        _record_demand(cache_key, time.monotonic())
 
-        context_part = ""
-        if context:
-            context_part = f"\nTopic: {context}"
-
-        prompt = f"""{mood_instruction} {lang_instruction}{context_part}
+    # On a miss, either claim the fetch (plan + mark its keys in flight) or,
+    # if another request is already fetching this key, wait for its batch and
+    # look again. Give up after IN_FLIGHT_WAIT so the caller can fall back.
+    give_up_at = time.monotonic() + IN_FLIGHT_WAIT
+    while True:
+        with _cache_lock:
+            cached = COMMENT_CACHE.get(cache_key)
+            comment = cached.pop(0) if cached else None
+            fetch_done = None if comment is not None else IN_FLIGHT.get(cache_key)
+            if comment is None and fetch_done is None:
+                plan = plan_batch(cache_key, time.monotonic())
+                fetch_done = threading.Event()
+                for entry in plan:
+                    IN_FLIGHT[entry["key"]] = fetch_done
+                break
+        if comment is not None:
+            logger.debug("Serving comment from CACHE.")
+            _count("cache_hits")
+            return comment
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            logger.debug("No comment after waiting on in-flight generation calls.")
+            return None
+        _count("coalesced_waits")
+        fetch_done.wait(remaining)
 
-Generate 5 distinct comments in the requested style.
-Ensure they are varied in tone and wording.
-Return ONLY the JSON object with the "comments" list.
-"""
+    _count("cache_misses")
+    try:
+        logger.debug("Cache miss. Fetching new batch from Gemini.", extra={"fields": {
+            "plan": [{"mood": e["mood"], "language": e["language"], "count": e["count"]} for e in plan]
+        }})
+        prompt, system_instruction = build_prompt(plan)
 
         current_config = types.GenerateContentConfig(
             temperature=1.0,
             top_p=0.95,
             top_k=64,
-            max_output_tokens=2000,
-            system_instruction=SYSTEM_INSTRUCTION,
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+            system_instruction=system_instruction,
             response_mime_type="application/json" # Force JSON output
         )
 
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt,
-            config=current_config
-        )
+        _count("backend_calls")
+        with stage("backend_call"):
+            response_text = backend.generate(prompt, current_config, plan)
         
-        if response.text:
-            import json
+        if response_text:
             try:
-                result_json = json.loads(response.text)
-                
-                comments_list = result_json.get("comments", [])
-                
-                if not comments_list:
-                    print("DEBUG: No comments found in JSON response.")
-                    return None
-
-                # Process and normalize comments
-                processed_comments = []
-                for item in comments_list:
-                    # Normalize keys
-                    norm_item = {k.lower(): v for k, v in item.items()}
-                    processed_comments.append(norm_item)
-
-                # Increment usage (1 API call)
-                _reset_if_new_day()
-                query_count += 1
-                _save_usage() # Persist the new count
-                
-                # 2. Store in Cache
-                # Return first one, cache the rest
-                first_comment = processed_comments.pop(0)
-                if processed_comments:
-                    COMMENT_CACHE[cache_key] = processed_comments
-                    print(f"DEBUG: Cached {len(processed_comments)} additional comments for this key.")
-                
-                return first_comment
-
+                result_json = json.loads(response_text)
             except json.JSONDecodeError as e:
-                print(f"JSON Decode Error: {e}")
-                print(f"Failed JSON text: {response.text}")
+                logger.warning(f"JSON Decode Error: {e}", extra={"fields": {"response_chars": len(response_text)}})
+                logger.debug(f"Failed JSON text (truncated): {response_text[:500]}")
+                _count("malformed_responses")
                 return None
+
+            batches = split_response(result_json, plan)
+            if not any(batches):
+                logger.warning("No comments found in JSON response.")
+                _count("malformed_responses")
+                return None
+
+            # Increment usage (1 API call, however many keys it served)
+            if backend.counts_quota:
+                with _stats_lock:
+                    _reset_if_new_day()
+                    query_count += 1
+                    _save_usage() # Persist the new count
+            _count("comments_generated", sum(len(b) for b in batches))
+            _count("packed_keys", len(plan) - 1)
+
+            # 2. Store in Cache
+            # Return the first comment for the requested key, pool the rest
+            first_comment = None
+            for entry, comments in zip(plan, batches):
+                if entry["key"] == cache_key and comments:
+                    first_comment = comments.pop(0)
+                if comments:
+                    with _cache_lock:
+                        COMMENT_CACHE.setdefault(entry["key"], []).extend(comments)
+                    logger.debug(f"Cached {len(comments)} additional comments for this key.",
+                                 extra={"fields": {"mood": entry["mood"], "language": entry["language"]}})
+            
+            return first_comment
         else:
-            print("Empty response from Gemini")
+            logger.warning("Empty response from Gemini")
+            _count("malformed_responses")
             return None
 
     except Exception as e:
-        print(f"Gemini API Error: {e}")
+        logger.error(f"Gemini API Error: {e}")
+        _count("backend_errors")
         return None
+
+    finally:
+        # Pools are filled above, so waiters find their comments when woken
+        with _cache_lock:
+            for entry in plan:
+                if IN_FLIGHT.get(entry["key"]) is fetch_done:
+                    del IN_FLIGHT[entry["key"]]
+        fetch_done.set()
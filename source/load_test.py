@@ -0,0 +1,226 @@
+"""
+Load-test driver for the comment API.
+
+Replays a request mix (one JSON object per line) against the app and
+reports throughput, tail latency, generation cache hit rate and fallback
+rate. Each line looks like:
+
+    {"method": "POST", "path": "/api/generate", "json": {"mood": "happy", "language": "english"}}
+
+Usage:
+    python load_test.py ../dataset/load_mix.jsonl --requests 500 --concurrency 8
+    python load_test.py mix.jsonl --url http://localhost:5000
+    python load_test.py --smoke
+
+Without --url the app is loaded in-process with the local generation
+backend, so no Gemini quota is used. --smoke only sends the same
+prompted search twice (cold, then from the candidate cache) and exits
+non-zero unless both succeed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX_FILE = os.path.abspath(os.path.join(SCRIPT_DIR, '../dataset/load_mix.jsonl'))
+
+
+def load_mix(path):
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            entry.setdefault("method", "POST" if "json" in entry else "GET")
+            entries.append(entry)
+    return entries
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class InProcessClient:
+    """Sends requests through Flask's test client (one per thread)."""
+
+    def __init__(self):
+        os.environ.setdefault("GENERATION_BACKEND", "local")
+        # Keep per-request access log lines out of the report
+        os.environ.setdefault("LOG_LEVELS", "access=WARNING")
+        # Every in-process request shares one client address; lift the
+        # per-client search rate limit so 429s don't skew the report
+        os.environ.setdefault("SEARCH_RATE_PER_SEC", "1000000")
+        os.environ.setdefault("SEARCH_BURST", "1000000")
+        sys.path.append(SCRIPT_DIR)
+        from app import app
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Sends requests to a running server over HTTP."""
+
+    def __init__(self, base_url, timeout):
+        import requests
+        self.session_factory = requests.Session
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.session_factory()
+        response = session.request(method, self.base_url + path, json=body, timeout=self.timeout)
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        return response.status_code, data
+
+
+SMOKE_SEARCH = {"prompt": "sunset by the river", "mood": "Romantic", "language": "english"}
+
+
+def smoke_check(client):
+    """Two identical prompted searches: the first fills the candidate cache, the second reads it."""
+    ok = True
+    for attempt in ("cold", "cached"):
+        status, data = client.request("POST", "/api/search", SMOKE_SEARCH)
+        results = data.get("results") if isinstance(data, dict) else None
+        print(f"/api/search ({attempt}): {status}, {len(results or [])} results")
+        # Error/System entries are status messages, not search results
+        ok = ok and status == 200 and bool(results) and all(
+            not isinstance(r, dict) or r.get("mood") != "Error" and r.get("style") != "System" for r in results)
+    return ok
+
+
+def generation_stats(client):
+    status, data = client.request("GET", "/api/usage")
+    if status != 200 or not data:
+        return {}
+    return data.get("generation", {})
+
+
+def run(client, mix, total_requests, concurrency, shuffle):
+    schedule = [mix[i % len(mix)] for i in range(total_requests)]
+    if shuffle:
+        random.shuffle(schedule)
+
+    latencies = defaultdict(list)
+    statuses = Counter()
+    sources = Counter()
+    lock = threading.Lock()
+
+    def send(entry):
+        start = time.perf_counter()
+        try:
+            status, data = client.request(entry["method"], entry["path"], entry.get("json"))
+        except Exception as e:
+            status, data = f"error:{type(e).__name__}", None
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[entry["path"]].append(elapsed)
+            statuses[status] += 1
+            if entry["path"] == "/api/generate" and isinstance(data, dict):
+                sources[data.get("source", "unknown")] += 1
+
+    before = generation_stats(client)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, schedule))
+    duration = time.perf_counter() - started
+    after = generation_stats(client)
+
+    return {
+        "duration": duration,
+        "latencies": latencies,
+        "statuses": statuses,
+        "sources": sources,
+        "before": before,
+        "after": after,
+    }
+
+
+def report(results, total_requests):
+    duration = results["duration"]
+    print(f"\nRequests:   {total_requests} in {duration:.2f}s")
+    print(f"Throughput: {total_requests / duration:.1f} req/s")
+    print(f"Statuses:   {dict(results['statuses'])}")
+
+    print(f"\n{'path':<16}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    all_latencies = []
+    for path, values in sorted(results["latencies"].items()):
+        values.sort()
+        all_latencies.extend(values)
+        print(f"{path:<16}{len(values):>7}"
+              f"{percentile(values, 50) * 1000:>9.1f}{percentile(values, 90) * 1000:>9.1f}"
+              f"{percentile(values, 99) * 1000:>9.1f}{values[-1] * 1000:>9.1f}")
+    all_latencies.sort()
+    if all_latencies:
+        print(f"{'all':<16}{len(all_latencies):>7}"
+              f"{percentile(all_latencies, 50) * 1000:>9.1f}{percentile(all_latencies, 90) * 1000:>9.1f}"
+              f"{percentile(all_latencies, 99) * 1000:>9.1f}{all_latencies[-1] * 1000:>9.1f}")
+
+    before, after = results["before"], results["after"]
+    if after:
+        hits = after.get("cache_hits", 0) - before.get("cache_hits", 0)
+        misses = after.get("cache_misses", 0) - before.get("cache_misses", 0)
+        errors = after.get("backend_errors", 0) - before.get("backend_errors", 0)
+        malformed = after.get("malformed_responses", 0) - before.get("malformed_responses", 0)
+        lookups = hits + misses
+        print(f"\nBackend:        {after.get('backend')}")
+        print(f"Cache hit rate: {hits / lookups:.1%} ({hits}/{lookups})" if lookups else "Cache hit rate: n/a")
+        print(f"Backend errors: {errors}, malformed responses: {malformed}")
+
+    sources = results["sources"]
+    generated = sum(sources.values())
+    if generated:
+        fallbacks = sources.get("Fallback", 0)
+        print(f"Fallback rate:  {fallbacks / generated:.1%} ({fallbacks}/{generated})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a request mix against the comment API.")
+    parser.add_argument("mix", nargs="?", default=DEFAULT_MIX_FILE, help="JSONL file of requests to replay")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent workers")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout in seconds")
+    parser.add_argument("--shuffle", action="store_true", help="Shuffle the replay order")
+    parser.add_argument("--smoke", action="store_true", help="Only run the repeated-search smoke check")
+    args = parser.parse_args()
+
+    client = HttpClient(args.url, args.timeout) if args.url else InProcessClient()
+    if args.smoke:
+        sys.exit(0 if smoke_check(client) else 1)
+
+    mix = load_mix(args.mix)
+    if not mix:
+        print(f"No requests found in {args.mix}")
+        return
+
+    results = run(client, mix, args.requests, args.concurrency, args.shuffle)
+    report(results, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import json
+import os
+import random
+import time
+
+try:
+    from gemini_service import GenerationBackend
+except ImportError:
+    from .gemini_service import GenerationBackend
+
+# Local stand-in for the Gemini API.
+# Returns schema-correct comment batches without touching the real quota,
+# with configurable latency and error injection for load testing.
+#
+# Configuration (environment variables):
+#   LOCAL_BACKEND_LATENCY         "fixed:S", "uniform:LO,HI", "normal:MEAN,SD"
+#                                 or "lognormal:MU,SIGMA" (seconds)
+#   LOCAL_BACKEND_QUOTA_RATE      fraction of calls raising a 429 quota error
+#   LOCAL_BACKEND_MALFORMED_RATE  fraction of calls returning broken JSON
+#   LOCAL_BACKEND_EMPTY_RATE      fraction of calls returning an empty body
+#   LOCAL_BACKEND_SEED            seed for reproducible runs
+
+DEFAULT_LATENCY = "lognormal:-0.5,0.4"  # ~0.6s median, long right tail
+
+EMOJIS = ["🎶", "❤️", "✨", "🔥", "🥺", "🙏", "🌸", "🎧", "💖", "🌙", "🎵", "😍"]
+
+ENGLISH_OPENERS = [
+    "The first time I played this song",
+    "Listening to this on my way home tonight",
+    "I had this melody on repeat all week and",
+    "Every time the chorus comes in",
+    "My mother used to hum something like this and",
+]
+
+ENGLISH_BODIES = [
+    "it felt like the music was written just for me.",
+    "the vocals carried me somewhere I did not expect.",
+    "I could not stop smiling at how honest the lyrics sound.",
+    "it reminded me why I fell in love with music in the first place.",
+    "the arrangement gave me goosebumps all over again.",
+]
+
+BENGALI_OPENERS = [
+    "প্রথমবার এই গানটা শুনে",
+    "আজ রাতে বাড়ি ফেরার পথে শুনছিলাম আর",
+    "সারা সপ্তাহ এই সুরটা বারবার শুনেছি আর",
+    "যতবার কোরাসটা আসে",
+]
+
+BENGALI_BODIES = [
+    "মনে হলো গানটা শুধু আমার জন্যই লেখা।",
+    "গলার সুর আমাকে অন্য এক জগতে নিয়ে গেল।",
+    "কথাগুলো এত সত্যি যে চোখে জল চলে এল।",
+    "আবার নতুন করে গানের প্রেমে পড়লাম।",
+]
+
+
+class QuotaExceededError(Exception):
+    """Raised to mimic a 429 RESOURCE_EXHAUSTED response from Gemini."""
+
+
+def _parse_latency(spec):
+    """Turn a latency spec string into a sampler: fn(rng) -> seconds."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+    kind = kind.strip().lower()
+
+    if kind == "fixed":
+        return lambda rng: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class LocalBackend(GenerationBackend):
+    """
+    Generation backend that fabricates comments locally.
+
+    Output follows the same JSON schema the real prompt asks for, so the
+    normal parsing/caching path in gemini_service is exercised end to end.
+    """
+    name = "local"
+    counts_quota = False
+
+    def __init__(self, latency=None, quota_rate=None, malformed_rate=None,
+                 empty_rate=None, seed=None):
+        latency = latency or os.getenv("LOCAL_BACKEND_LATENCY", DEFAULT_LATENCY)
+        self.sample_latency = _parse_latency(latency)
+        self.quota_rate = quota_rate if quota_rate is not None else float(os.getenv("LOCAL_BACKEND_QUOTA_RATE", 0))
+        self.malformed_rate = malformed_rate if malformed_rate is not None else float(os.getenv("LOCAL_BACKEND_MALFORMED_RATE", 0))
+        self.empty_rate = empty_rate if empty_rate is not None else float(os.getenv("LOCAL_BACKEND_EMPTY_RATE", 0))
+        if seed is None and os.getenv("LOCAL_BACKEND_SEED"):
+            seed = int(os.getenv("LOCAL_BACKEND_SEED"))
+        self.rng = random.Random(seed)
+
+    def _make_comment(self, mood, language, context):
+        if language and language.lower() == "bengali":
+            text = f"{self.rng.choice(BENGALI_OPENERS)} {self.rng.choice(BENGALI_BODIES)}"
+        else:
+            text = f"{self.rng.choice(ENGLISH_OPENERS)} {self.rng.choice(ENGLISH_BODIES)}"
+            if context:
+                text += f" It says everything about {context} that I never could."
+        text += " " + " ".join(self.rng.sample(EMOJIS, 3))
+        return {
+            "comment": text,
+            "mood": mood,
+            "style": self.rng.choice(["Personal", "Storytelling", "Heartfelt", "Nostalgic"])
+        }
+
+    def generate(self, prompt, config, plan):
+        time.sleep(self.sample_latency(self.rng))
+
+        roll = self.rng.random()
+        if roll < self.quota_rate:
+            raise QuotaExceededError("429 RESOURCE_EXHAUSTED: simulated quota error")
+        roll -= self.quota_rate
+        if roll < self.empty_rate:
+            return ""
+        roll -= self.empty_rate
+        malformed = roll < self.malformed_rate
+
+        batches = []
+        for entry in plan:
+            comments = [
+                self._make_comment(entry["mood"], entry["language"], entry.get("context"))
+                for _ in range(entry.get("count", 5))
+            ]
+            batches.append(comments)
+
+        if len(batches) == 1:
+            text = json.dumps({"comments": batches[0]}, ensure_ascii=False)
+        else:
+            text = json.dumps({"batches": [
+                {"request": i, "comments": comments} for i, comments in enumerate(batches, start=1)
+            ]}, ensure_ascii=False)
+        if malformed:
+            # Truncate mid-object, like a response cut off by max_output_tokens
+            return text[: max(1, len(text) // 2)]
+        return text
@@ -0,0 +1,201 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+# Structured, non-blocking logging for the API.
+#
+# Log calls only put the record on a bounded in-memory queue; a background
+# QueueListener thread formats and writes it to stdout. If the queue is
+# full the record is dropped (and counted) rather than blocking a request.
+#
+# Configuration (environment variables):
+#   LOG_LEVEL       default level for all loggers (INFO)
+#   LOG_LEVELS      per-module overrides, e.g. "smart_search=DEBUG,access=WARNING"
+#   LOG_FORMAT      "json" (default) or "text"
+#   LOG_QUEUE_SIZE  max records waiting to be written (10000)
+#
+# Every line carries the request id (X-Request-ID header, or generated) and,
+# for the access log line, the timings of the stages marked with
+# profiling.stage().
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+_setup_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps each record with the current request id (runs on the calling thread)."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of raising when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        """
+        Like QueueHandler.prepare(), but keeps the traceback in exc_text
+        instead of folding it into msg, so formatters can emit it separately.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        fields = getattr(record, "fields", None)
+        if fields:
+            for key, value in fields.items():
+                # Caller fields never replace the standard keys
+                entry[f"field_{key}" if key in entry or key == "exc" else key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def formatMessage(self, record):
+        # Fields stay on the message line, ahead of any traceback
+        line = super().formatMessage(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def _parse_levels(spec):
+    levels = {}
+    for part in spec.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """Install the queue-backed handler on the root logger (idempotent)."""
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(LOG_LEVEL)
+        for name, level in _parse_levels(LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    """Logger for a service module; configures logging on first use."""
+    setup_logging()
+    return logging.getLogger(name)
+
+
+def dropped_records():
+    """Records dropped because the queue was full (reported by /api/usage)."""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+# --- Request context ---
+
+def current_stage_timings():
+    """Stage timing list of the current request, or None outside a request."""
+    return _stage_timings.get()
+
+
+def init_app(app):
+    """Attach request ids and a per-request access log line to a Flask app."""
+    from flask import request
+
+    access_logger = get_logger("access")
+
+    @app.before_request
+    def _start_request():
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        _request_id.set(request_id)
+        _stage_timings.set([])
+        request.environ['log.started'] = time.perf_counter()
+
+    @app.after_request
+    def _log_request(response):
+        request_id = _request_id.get()
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+
+        started = request.environ.get('log.started')
+        if started is not None and access_logger.isEnabledFor(logging.INFO):
+            stages = {}
+            for name, duration in _stage_timings.get() or []:
+                stages[name] = round(stages.get(name, 0) + duration * 1000, 3)
+            access_logger.info(
+                f"{request.method} {request.path} {response.status_code}",
+                extra={"fields": {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "stages": stages,
+                }}
+            )
+        return response
+
+    @app.teardown_request
+    def _end_request(exc):
+        _request_id.set(None)
+        _stage_timings.set(None)
@@ -3,6 +3,9 @@ import json
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import os
+import sys
+import zlib
+import argparse
 
 # Absolute paths relative to this script
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,6 +14,9 @@ INPUT_FILE = os.path.join(SCRIPT_DIR, '../dataset/comments.xlsx')
 # output is at ../dataset/ from source/ dir
 OUTPUT_DATA_FILE = os.path.join(SCRIPT_DIR, '../dataset/comments.json')
 OUTPUT_EMBEDDINGS_FILE = os.path.join(SCRIPT_DIR, '../dataset/embeddings.npy')
+# shards are written to ../dataset/shards/shard_XX/ (see shard_server.py)
+OUTPUT_SHARDS_DIR = os.path.join(SCRIPT_DIR, '../dataset/shards')
+SHARD_MANIFEST_FILE = 'manifest.json'
 
 def prepare_data():
     print(f"Script Directory: {SCRIPT_DIR}")
@@ -88,6 +94,83 @@ def prepare_data():
         return
     
     print("Done!")
+    return True
+
+def assign_shards(data, num_shards, shard_by):
+    """
+    Returns a shard number for each row.
+    'hash' spreads rows by a stable hash of their id.
+    'language_mood' keeps each (language, mood) group on one shard, placing
+    the largest groups first onto the least-loaded shard.
+    """
+    if shard_by == 'hash':
+        return [zlib.crc32(item['id'].encode('utf-8')) % num_shards for item in data]
+
+    groups = {}
+    for i, item in enumerate(data):
+        groups.setdefault((item['language'], item['mood']), []).append(i)
+
+    loads = [0] * num_shards
+    assignment = [0] * len(data)
+    for key, rows in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        shard = loads.index(min(loads))
+        loads[shard] += len(rows)
+        for i in rows:
+            assignment[i] = shard
+    return assignment
+
+def write_shards(data, embeddings, num_shards, shard_by):
+    """Partition comments + embeddings into shard directories with a manifest."""
+    print(f"Writing {num_shards} shards (by {shard_by}) to {OUTPUT_SHARDS_DIR}...")
+    assignment = assign_shards(data, num_shards, shard_by)
+
+    manifest = {"shard_by": shard_by, "total": len(data), "shards": []}
+    for shard in range(num_shards):
+        rows = [i for i, s in enumerate(assignment) if s == shard]
+        name = f"shard_{shard:02d}"
+        shard_dir = os.path.join(OUTPUT_SHARDS_DIR, name)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        with open(os.path.join(shard_dir, 'comments.json'), 'w', encoding='utf-8') as f:
+            json.dump([data[i] for i in rows], f, ensure_ascii=False, indent=2)
+        np.save(os.path.join(shard_dir, 'embeddings.npy'), embeddings[rows])
+
+        keys = sorted({f"{data[i]['language']}|{data[i]['mood']}" for i in rows})
+        manifest["shards"].append({"name": name, "rows": len(rows), "keys": keys})
+        print(f"  {name}: {len(rows)} comments")
+
+    with open(os.path.join(OUTPUT_SHARDS_DIR, SHARD_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+def shard_existing(num_shards, shard_by):
+    """Shard the already-prepared comments.json/embeddings.npy without re-encoding."""
+    try:
+        with open(OUTPUT_DATA_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        embeddings = np.load(OUTPUT_EMBEDDINGS_FILE)
+    except Exception as e:
+        print(f"Error loading prepared data: {e}")
+        return
+
+    if len(data) != len(embeddings):
+        print(f"Error: {len(data)} comments but {len(embeddings)} embeddings.")
+        return
+
+    write_shards(data, embeddings, num_shards, shard_by)
+    print("Done!")
 
 if __name__ == "__main__":
-    prepare_data()
+    parser = argparse.ArgumentParser(description="Prepare comments.json and embeddings.npy from the Excel dataset.")
+    parser.add_argument("--shards", type=int, default=0, help="Also partition the corpus into N shards")
+    parser.add_argument("--shard-by", choices=["language_mood", "hash"], default="language_mood")
+    parser.add_argument("--shards-only", action="store_true", help="Shard the existing prepared files without re-encoding")
+    args = parser.parse_args()
+
+    if args.shards_only:
+        if args.shards < 1:
+            print("Error: --shards-only needs --shards N")
+            sys.exit(1)
+        shard_existing(args.shards, args.shard_by)
+    else:
+        if prepare_data() and args.shards > 0:
+            shard_existing(args.shards, args.shard_by)
@@ -0,0 +1,201 @@
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    from log_setup import current_stage_timings, get_logger
+except ImportError:
+    from .log_setup import current_stage_timings, get_logger
+
+logger = get_logger("profiling")
+
+# On-demand request profiling.
+#
+# A request is profiled when either:
+#   - it carries the secret PROFILE_TOKEN in the X-Profile-Token header or
+#     the ?profile= query parameter, or
+#   - it is picked by random sampling at PROFILE_SAMPLE_RATE (0.0 - 1.0).
+#
+# Profiles are written to PROFILE_DIR as a pair of files per request:
+#   <id>.collapsed (PROFILE_MODE=sample, default) - folded stacks for
+#                  flamegraph.pl / speedscope, from a sampling thread
+#   <id>.pstats    (PROFILE_MODE=cprofile)        - cProfile stats
+#   <id>.json      - path, status, total time and per-stage timings
+#
+# With neither a token nor a sample rate configured, init_app() registers
+# no hooks. stage() then only records a duration for the request's access
+# log line (see log_setup.py).
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.abspath(os.path.join(SCRIPT_DIR, '../profiles')))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample").lower()
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))  # seconds between stack samples
+
+ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+# Endpoints that can be profiled
+PROFILED_PATHS = ('/api/search', '/api/browse', '/api/generate')
+
+_local = threading.local()
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(parts))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Profiler + stage timings for a single request."""
+
+    def __init__(self, method, path):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}_{path.strip('/').replace('/', '-')}_{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.stages = []
+        self.started = time.perf_counter()
+        self.sampler = None
+        self.profiler = None
+
+        if PROFILE_MODE == "cprofile":
+            import cProfile
+            try:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+            except ValueError:
+                # Another request already holds the interpreter's profiler
+                self.profiler = None
+        if self.profiler is None:
+            self.sampler = StackSampler(threading.get_ident())
+            self.sampler.start()
+
+    def add_stage(self, name, start, end):
+        self.stages.append({
+            "stage": name,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3)
+        })
+
+    def finish(self, status):
+        total = time.perf_counter() - self.started
+        if self.profiler:
+            self.profiler.disable()
+        if self.sampler:
+            self.sampler.stop()
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        if self.profiler:
+            self.profiler.dump_stats(base + ".pstats")
+        if self.sampler:
+            with open(base + ".collapsed", 'w', encoding='utf-8') as f:
+                f.write(self.sampler.collapsed())
+
+        with open(base + ".json", 'w', encoding='utf-8') as f:
+            json.dump({
+                "method": self.method,
+                "path": self.path,
+                "status": status,
+                "mode": "cprofile" if self.profiler else "sample",
+                "total_ms": round(total * 1000, 3),
+                "samples": sum(self.sampler.stacks.values()) if self.sampler else None,
+                "stages": self.stages
+            }, f, indent=2)
+        logger.info("Profile written", extra={"fields": {"profile": base + ".json", "total_ms": round(total * 1000, 3)}})
+
+
+@contextmanager
+def stage(name):
+    """Time a named stage of the current request (for its profile and access log line)."""
+    profile = getattr(_local, "profile", None)
+    timings = current_stage_timings()
+    if profile is None and timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if profile is not None:
+            profile.add_stage(name, start, end)
+        if timings is not None:
+            timings.append((name, end - start))
+
+
+def _should_profile(request):
+    if request.path not in PROFILED_PATHS:
+        return False
+    if PROFILE_TOKEN:
+        token = request.headers.get('X-Profile-Token') or request.args.get('profile')
+        if token and hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8')):
+            return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _finish(status):
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return
+    _local.profile = None
+    try:
+        profile.finish(status)
+    except Exception as e:
+        logger.error(f"Error writing profile: {e}")
+
+
+def init_app(app):
+    """Register the profiling hooks on a Flask app (only if profiling is configured)."""
+    if not ENABLED:
+        return
+
+    from flask import request
+
+    @app.before_request
+    def _start_profile():
+        _local.profile = RequestProfile(request.method, request.path) if _should_profile(request) else None
+
+    @app.after_request
+    def _stop_profile(response):
+        if getattr(_local, "profile", None) is not None:
+            response.headers['X-Profile-Id'] = _local.profile.id
+            _finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # Only still set if the view raised before after_request ran
+        _finish(500)
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+try:
+    from log_setup import get_logger
+except ImportError:
+    from .log_setup import get_logger
+
+logger = get_logger("query_encoder")
+
+# Query encoder backends for Smart Search and the fallback service.
+#
+# ENCODER_BACKEND selects the implementation:
+#   "torch" (default) - full sentence-transformers / PyTorch model
+#   "onnx"            - exported ONNX graph run with onnxruntime and the
+#                       standalone `tokenizers` package (no torch import)
+#
+# The ONNX files are produced by export_onnx.py into ENCODER_ONNX_DIR.
+# Set ENCODER_ONNX_QUANTIZED=1 to load the int8-quantized graph.
+#
+# A failed load is remembered for ENCODER_RETRY_AFTER seconds, so requests
+# in the meantime get None straight away instead of retrying the load.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_NAME = 'all-MiniLM-L6-v2'
+HF_MODEL_ID = f'sentence-transformers/{MODEL_NAME}'
+MAX_SEQ_LENGTH = 256  # Same truncation as the sentence-transformers model
+
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch").lower()
+ONNX_DIR = os.getenv("ENCODER_ONNX_DIR", os.path.abspath(os.path.join(SCRIPT_DIR, '../dataset/onnx')))
+ONNX_QUANTIZED = os.getenv("ENCODER_ONNX_QUANTIZED", "0").lower() in ("1", "true", "yes")
+ENCODER_RETRY_AFTER = float(os.getenv("ENCODER_RETRY_AFTER", 300))
+
+ONNX_MODEL_FILE = 'model.onnx'
+ONNX_QUANTIZED_MODEL_FILE = 'model_int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+
+# Global encoder instance (lazy)
+ENCODER = None
+_encoder_failed_at = None
+_encoder_lock = threading.Lock()
+
+
+class TorchEncoder:
+    """Wraps sentence-transformers; this is what produced dataset/embeddings.npy."""
+    name = "torch"
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(MODEL_NAME)
+
+    def encode(self, texts):
+        return self.model.encode(texts)
+
+
+class OnnxEncoder:
+    """
+    Runs the exported ONNX graph on CPU.
+    Reproduces the sentence-transformers pipeline: transformer -> mean
+    pooling over the attention mask -> L2 normalisation.
+    """
+    name = "onnx"
+
+    def __init__(self, onnx_dir=ONNX_DIR, quantized=ONNX_QUANTIZED):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.np = np
+        model_file = ONNX_QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        self.model_path = os.path.join(onnx_dir, model_file)
+        if quantized:
+            self.name = "onnx-int8"
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(onnx_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts):
+        np = self.np
+        if isinstance(texts, str):
+            texts = [texts]
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling
+        mask = attention_mask[..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+
+        # Normalize
+        norms = np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return (embeddings / norms).astype(np.float32)
+
+
+def create_encoder(backend=None):
+    """Build an encoder for the given backend name ("torch", "onnx", "onnx-int8")."""
+    backend = (backend or ENCODER_BACKEND).lower()
+    if backend == "onnx":
+        return OnnxEncoder()
+    if backend == "onnx-int8":
+        return OnnxEncoder(quantized=True)
+    return TorchEncoder()
+
+
+def get_encoder():
+    """Shared encoder selected by ENCODER_BACKEND, or None if it cannot load."""
+    global ENCODER, _encoder_failed_at
+    if ENCODER is not None:
+        return ENCODER
+    with _encoder_lock:
+        if ENCODER is not None:
+            return ENCODER
+        if _encoder_failed_at is not None and time.monotonic() - _encoder_failed_at < ENCODER_RETRY_AFTER:
+            return None
+        try:
+            logger.info(f"Loading query encoder ({ENCODER_BACKEND})...")
+            ENCODER = create_encoder()
+            _encoder_failed_at = None
+        except ImportError as e:
+            logger.warning(f"Query encoder dependency missing: {e}")
+            _encoder_failed_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error loading query encoder: {e}")
+            _encoder_failed_at = time.monotonic()
+    return ENCODER
@@ -0,0 +1,124 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from log_setup import get_logger
+except ImportError:
+    from .log_setup import get_logger
+
+logger = get_logger("shard_coordinator")
+
+# Scatter-gather coordinator for sharded Smart Search.
+#
+# When SHARD_URLS is set (comma-separated shard server base URLs, see
+# shard_server.py), smart_search sends each query to every shard in
+# parallel and merges their top-k lists. Shards that have not answered
+# within SHARD_DEADLINE seconds are skipped so one slow or missing node
+# only costs recall, not latency.
+#
+# Each shard reports a version for the data it serves. data_version()
+# combines them for smart_search's candidate cache keys; it is updated
+# from every search response and by a background thread polling
+# /shard/health every SHARD_VERSION_TTL seconds, so re-prepared shards
+# behind the same URLs stop matching old cache entries. Reading it never
+# touches the network.
+
+SHARD_URLS = [url.strip().rstrip("/") for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+SHARD_DEADLINE = float(os.getenv("SHARD_DEADLINE", 0.5))
+SHARD_VERSION_TTL = float(os.getenv("SHARD_VERSION_TTL", 30))
+
+_executor = None
+_session = None
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def is_enabled():
+    return bool(SHARD_URLS)
+
+
+def _get_executor():
+    global _executor, _session
+    if _executor is None:
+        import requests
+        _session = requests.Session()
+        _executor = ThreadPoolExecutor(max_workers=max(4, len(SHARD_URLS) * 4))
+        threading.Thread(target=_poll_versions, name="shard-versions", daemon=True).start()
+    return _executor
+
+
+def _record_version(url, data):
+    version = data.get("version")
+    if version is not None:
+        with _versions_lock:
+            _versions[url] = version
+
+
+def _query_shard(url, payload, timeout):
+    response = _session.post(f"{url}/shard/search", json=payload, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    _record_version(url, data)
+    return data.get("results", [])
+
+
+def _query_health(url, timeout):
+    response = _session.get(f"{url}/shard/health", timeout=timeout)
+    response.raise_for_status()
+    _record_version(url, response.json())
+
+
+def _poll_versions():
+    """Background loop: refresh shard versions from /shard/health."""
+    while True:
+        time.sleep(SHARD_VERSION_TTL)
+        futures = {_executor.submit(_query_health, url, SHARD_DEADLINE): url for url in SHARD_URLS}
+        done, _ = wait(futures, timeout=SHARD_DEADLINE)
+        for future in done:
+            if future.exception() is not None:
+                logger.warning(f"Shard {futures[future]} health check failed: {future.exception()}")
+
+
+def data_version():
+    """Combined version of the data on all shards ("?" for shards not heard from yet)."""
+    with _versions_lock:
+        return ",".join(f"{url}={_versions.get(url, '?')}" for url in SHARD_URLS)
+
+
+def search_shards(language, mood, vector, k, deadline=None):
+    """
+    Fan a query out to all shards and merge the results.
+
+    vector: query embedding (list of floats), or None for random samples.
+    Returns (results, stats). Results are dicts with id/text/style/distance,
+    sorted by distance for vector queries. stats counts shards that
+    answered, timed out or failed, so callers can tell partial answers apart.
+    """
+    deadline = SHARD_DEADLINE if deadline is None else deadline
+    executor = _get_executor()
+    payload = {"language": language, "mood": mood, "vector": vector, "k": k}
+
+    futures = {executor.submit(_query_shard, url, payload, deadline): url for url in SHARD_URLS}
+    done, not_done = wait(futures, timeout=deadline)
+
+    stats = {"queried": len(futures), "answered": 0, "timed_out": len(not_done), "failed": 0}
+    merged = []
+    for future in done:
+        try:
+            merged.extend(future.result())
+            stats["answered"] += 1
+        except Exception as e:
+            logger.warning(f"Shard {futures[future]} failed: {e}")
+            stats["failed"] += 1
+    for future in not_done:
+        logger.warning(f"Shard {futures[future]} missed the {deadline}s deadline.")
+
+    if vector is None:
+        return random.sample(merged, min(k, len(merged))), stats
+
+    merged.sort(key=lambda r: r["distance"])
+    return merged[:k], stats
@@ -0,0 +1,169 @@
+"""
+Shard server for sharded Smart Search.
+
+Serves one shard written by `prepare_data.py --shards N`:
+
+    python shard_server.py --shard-dir ../dataset/shards/shard_00 --port 5101
+
+Or start one process per shard in the manifest on this machine:
+
+    python shard_server.py --launch-all --base-port 5100
+
+then point the app at them with the printed SHARD_URLS value.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+from flask import Flask, request, jsonify
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from log_setup import get_logger, init_app as init_request_logging
+
+logger = get_logger("shard_server")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARDS_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '../dataset/shards'))
+SHARD_MANIFEST_FILE = 'manifest.json'
+
+
+def _shard_version(shard_dir):
+    """Identify the shard files being served (mtime + size), for coordinator cache keys."""
+    parts = []
+    for filename in ('comments.json', 'embeddings.npy'):
+        stat = os.stat(os.path.join(shard_dir, filename))
+        parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+    return "/".join(parts)
+
+
+class ShardIndex:
+    """
+    Comments + embeddings for one shard, grouped by (language, mood).
+    Search is exact L2 over the group, same as the IndexFlatL2 used in
+    smart_search, so merged results match a single-node search.
+    """
+
+    def __init__(self, shard_dir):
+        self.name = os.path.basename(os.path.normpath(shard_dir))
+        self.version = _shard_version(shard_dir)
+        with open(os.path.join(shard_dir, 'comments.json'), 'r', encoding='utf-8') as f:
+            self.comments = json.load(f)
+        self.embeddings = np.load(os.path.join(shard_dir, 'embeddings.npy')).astype(np.float32)
+
+        self.groups = {}
+        for i, item in enumerate(self.comments):
+            key = (item['language'].lower(), item['mood'].lower())
+            self.groups.setdefault(key, []).append(i)
+        self.groups = {key: np.array(rows) for key, rows in self.groups.items()}
+        logger.info(f"Shard {self.name}: loaded {len(self.comments)} comments in {len(self.groups)} groups.")
+
+    def _record(self, row, distance=None):
+        item = self.comments[row]
+        return {
+            "id": item.get('id'),
+            "text": item['text'],
+            "style": item.get('style', 'Smart Search'),
+            "distance": distance
+        }
+
+    def search(self, language, mood, vector, k):
+        rows = self.groups.get((language.lower(), mood.lower()))
+        if rows is None or k <= 0:
+            return []
+
+        if vector is None:
+            chosen = random.sample(list(rows), min(k, len(rows)))
+            return [self._record(int(row)) for row in chosen]
+
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        distances = ((self.embeddings[rows] - query) ** 2).sum(axis=1)
+        k = min(k, len(rows))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [self._record(int(rows[i]), float(distances[i])) for i in top]
+
+
+def create_app(shard_dir):
+    index = ShardIndex(shard_dir)
+    app = Flask(__name__)
+    init_request_logging(app)
+
+    @app.route('/shard/search', methods=['POST'])
+    def shard_search():
+        """
+        Accepts: language, mood, k, vector (optional; omit for random samples)
+        """
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        results = index.search(
+            data.get('language', 'english'),
+            data.get('mood', 'romantic'),
+            data.get('vector'),
+            int(data.get('k', 10))
+        )
+        return jsonify({"shard": index.name, "version": index.version, "results": results})
+
+    @app.route('/shard/health', methods=['GET'])
+    def shard_health():
+        keys = sorted(f"{lang}|{mood}" for lang, mood in index.groups)
+        return jsonify({"shard": index.name, "version": index.version, "rows": len(index.comments), "keys": keys})
+
+    return app
+
+
+def launch_all(shards_dir, base_port, host):
+    """Start one shard server process per shard in the manifest."""
+    with open(os.path.join(shards_dir, SHARD_MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    processes = []
+    urls = []
+    for i, shard in enumerate(manifest["shards"]):
+        port = base_port + i
+        shard_dir = os.path.join(shards_dir, shard["name"])
+        processes.append(subprocess.Popen([
+            sys.executable, os.path.abspath(__file__),
+            "--shard-dir", shard_dir, "--port", str(port), "--host", host
+        ]))
+        urls.append(f"http://{host}:{port}")
+
+    print(f"\nStarted {len(processes)} shard servers. Run the app with:")
+    print(f"  SHARD_URLS={','.join(urls)}\n")
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Smart Search shards.")
+    parser.add_argument("--shard-dir", help="Directory of a single shard to serve")
+    parser.add_argument("--port", type=int, default=5101)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--launch-all", action="store_true", help="Start a process for every shard in the manifest")
+    parser.add_argument("--shards-dir", default=SHARDS_DIR, help="Where prepare_data.py wrote the shards")
+    parser.add_argument("--base-port", type=int, default=5100)
+    args = parser.parse_args()
+
+    if args.launch_all:
+        launch_all(args.shards_dir, args.base_port, args.host)
+    elif args.shard_dir:
+        create_app(args.shard_dir).run(host=args.host, port=args.port, threaded=True)
+    else:
+        parser.error("either --shard-dir or --launch-all is required")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,23 @@
+import logging
 import random
 import os
 import sys
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+
+try:
+    from query_encoder import get_encoder
+    from profiling import stage
+    from log_setup import get_logger
+    import shard_coordinator
+except ImportError:
+    from .query_encoder import get_encoder
+    from .profiling import stage
+    from .log_setup import get_logger
+    from . import shard_coordinator
+
+logger = get_logger("smart_search")
 
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,29 +29,34 @@ DF = None
 EMBEDDINGS = None
 MODEL = None
 INDEX = None
+DATASET_VERSION = None
+
+# Candidate-Set Cache
+# Format: {(dataset_version, language, mood, normalized_prompt, fetch_k): (row_ids, distances)}
+# Repeat searches skip the encode + FAISS search and only redo the random draw.
+CANDIDATE_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+CANDIDATE_CACHE = OrderedDict()
+_candidate_cache_lock = threading.Lock()
 
 # Lazy Loader for Heavy Dependencies
 pd = None
 np = None
 faiss = None
-SentenceTransformer = None
 
 def _import_heavy_deps():
-    global pd, np, faiss, SentenceTransformer
+    global pd, np, faiss
     if pd is None:
         try:
             import pandas as pd_module
             import numpy as np_module
             import faiss as faiss_module
-            from sentence_transformers import SentenceTransformer as ST_module
             
             pd = pd_module
             np = np_module
             faiss = faiss_module
-            SentenceTransformer = ST_module
             return True
         except ImportError as e:
-            print(f"Smart Search dependency missing: {e}")
+            logger.warning(f"Smart Search dependency missing: {e}")
             return False
 
 # Mood Keywords & Emoji Pools (From file.txt)
@@ -57,8 +79,19 @@ EMOJI_POOLS = {
     "Admiring": ["👏", "🔥", "🙏", "✨", "🤩", "💯", "🙌"]
 }
 
+def _dataset_version():
+    """Identify the on-disk dataset (mtime + size of data and embeddings files)."""
+    parts = []
+    for path in (DATA_FILE, EMBEDDINGS_FILE):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append("missing")
+    return "/".join(parts)
+
 def load_resources():
-    global DF, EMBEDDINGS, MODEL, pd, np, SentenceTransformer
+    global DF, EMBEDDINGS, MODEL, DATASET_VERSION, pd, np
     
     # Try to import heavy deps
     if not _import_heavy_deps():
@@ -66,26 +99,26 @@ def load_resources():
 
     if DF is None and os.path.exists(DATA_FILE):
         try:
-            print("Loading dataset...")
+            logger.info("Loading dataset...")
             DF = pd.read_json(DATA_FILE)
-            print(f"Loaded {len(DF)} comments.")
+            logger.info(f"Loaded {len(DF)} comments.")
         except Exception as e:
-            print(f"Error loading dataset: {e}")
+            logger.error(f"Error loading dataset: {e}")
 
     if EMBEDDINGS is None and os.path.exists(EMBEDDINGS_FILE):
         try:
-            print("Loading embeddings...")
+            logger.info("Loading embeddings...")
             EMBEDDINGS = np.load(EMBEDDINGS_FILE)
-            print(f"Loaded embeddings shape: {EMBEDDINGS.shape}")
+            logger.info(f"Loaded embeddings shape: {EMBEDDINGS.shape}")
         except Exception as e:
-            print(f"Error loading embeddings: {e}")
+            logger.error(f"Error loading embeddings: {e}")
+
+    if DATASET_VERSION is None and DF is not None and EMBEDDINGS is not None:
+        DATASET_VERSION = _dataset_version()
 
     if MODEL is None:
-        try:
-            print("Loading SentenceTransformer model...")
-            MODEL = SentenceTransformer('all-MiniLM-L6-v2')
-        except Exception as e:
-            print(f"Error loading model: {e}")
+        # Backend (torch / onnx) is chosen by ENCODER_BACKEND, see query_encoder.py
+        MODEL = get_encoder()
 
 def detect_language(prompt):
     prompt_lower = prompt.lower()
@@ -107,8 +140,104 @@ def add_emojis(text, mood):
     chosen = random.sample(emojis, min(2, len(emojis)))
     return text + " " + " ".join(chosen)
 
-def generate_from_prompt(user_prompt, mood=None, language=None, top_k=6):
-    load_resources()
+def _normalize_prompt(prompt):
+    return " ".join(prompt.lower().split())
+
+def _resolve_filters(user_prompt, mood, language):
+    """Pick target language/mood: explicit filters win, else detect from the prompt."""
+    target_lang = language.lower() if language else detect_language(user_prompt).lower()
+    target_mood = mood if mood else detect_mood(user_prompt)
+    return target_lang, target_mood
+
+def _cache_version():
+    """Dataset version for cache keys; in sharded mode the shards report their own."""
+    if shard_coordinator.is_enabled():
+        return "shards:" + shard_coordinator.data_version()
+    return DATASET_VERSION
+
+def _candidate_key(target_lang, target_mood, user_prompt, fetch_k):
+    return (_cache_version(), target_lang, target_mood.lower(), _normalize_prompt(user_prompt), fetch_k)
+
+def _cache_get(key):
+    with _candidate_cache_lock:
+        entry = CANDIDATE_CACHE.get(key)
+        if entry is not None:
+            CANDIDATE_CACHE.move_to_end(key)
+        return entry
+
+def _cache_put(key, entry):
+    if CANDIDATE_CACHE_SIZE <= 0:
+        return
+    with _candidate_cache_lock:
+        CANDIDATE_CACHE[key] = entry
+        CANDIDATE_CACHE.move_to_end(key)
+        while len(CANDIDATE_CACHE) > CANDIDATE_CACHE_SIZE:
+            CANDIDATE_CACHE.popitem(last=False)
+
+def clear_candidate_cache():
+    with _candidate_cache_lock:
+        CANDIDATE_CACHE.clear()
+
+def _generate_sharded(user_prompt, mood, language, top_k, semantic, admit):
+    """
+    Same contract as generate_from_prompt, but the corpus lives on shard
+    servers (see shard_coordinator.py). The query is encoded once here and
+    the vector is sent to every shard.
+    """
+    target_lang, target_mood = _resolve_filters(user_prompt, mood, language)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sharded search query", extra={"fields": {"prompt": user_prompt, "language": target_lang, "mood": target_mood}})
+
+    if not semantic or not user_prompt.strip():
+        with stage("shard_fanout"):
+            records, _ = shard_coordinator.search_shards(target_lang, target_mood, None, top_k)
+    else:
+        fetch_k = top_k * 3
+        cache_key = _candidate_key(target_lang, target_mood, user_prompt, fetch_k)
+        cached = _cache_get(cache_key)
+
+        if cached is None:
+            model = get_encoder()
+            if model is None:
+                return [{"comment": "Model loading failed.", "mood": "Error", "style": "Error"}]
+            with admit():
+                with stage("encode"):
+                    query_vector = model.encode([user_prompt])[0].tolist()
+                with stage("shard_fanout"):
+                    candidates, stats = shard_coordinator.search_shards(target_lang, target_mood, query_vector, fetch_k)
+            cached = (candidates, [c["distance"] for c in candidates])
+            # Don't cache partial answers from a slow or missing shard. The
+            # key is rebuilt because the responses carry the shard versions.
+            if stats["answered"] == stats["queried"]:
+                _cache_put(_candidate_key(target_lang, target_mood, user_prompt, fetch_k), cached)
+
+        candidates, _ = cached
+        records = random.sample(candidates, top_k) if len(candidates) > top_k else candidates
+
+    if not records:
+        return [f"No matching {target_lang} {target_mood} comments found."]
+
+    return [{
+        "comment": add_emojis(record["text"], target_mood),
+        "mood": target_mood,
+        "style": record.get("style") or "Smart Search"
+    } for record in records]
+
+def generate_from_prompt(user_prompt, mood=None, language=None, top_k=6, semantic=True, admit=None):
+    """
+    Find comments matching the prompt.
+    With semantic=False the prompt is only used for mood/language detection
+    and random samples are returned (cheap path used under overload).
+    admit: optional context manager factory entered around the encode +
+    search when the candidate cache misses (e.g. an admission slot); it may
+    raise to reject the request.
+    """
+    admit = admit or nullcontext
+    if shard_coordinator.is_enabled():
+        return _generate_sharded(user_prompt or "", mood, language, top_k, semantic, admit)
+
+    with stage("load_resources"):
+        load_resources()
     
     # Check if critical deps are loaded
     if pd is None or np is None or faiss is None:
@@ -124,22 +253,21 @@ def generate_from_prompt(user_prompt, mood=None, language=None, top_k=6):
     # Logic: If mood/lang are provided (from buttons), use them.
     # Otherwise, detect from prompt.
     
-    target_lang = language.lower() if language else detect_language(user_prompt).lower()
-    target_mood = mood if mood else detect_mood(user_prompt)
+    target_lang, target_mood = _resolve_filters(user_prompt, mood, language)
     
     # Start detection log
-    print(f"Search Query: '{user_prompt}'")
-    print(f"Target Language: {target_lang}")
-    print(f"Target Mood: {target_mood}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Search query", extra={"fields": {"prompt": user_prompt, "language": target_lang, "mood": target_mood}})
 
     # Normalize DataFrame columns for comparison (if simpler)
     # Assuming dataset has 'language' (lowercased) and 'mood' (mixed)
     
     # Filter DataFrame
-    filtered_df = DF[
-        (DF["language"].str.lower() == target_lang) &
-        (DF["mood"].str.lower() == target_mood.lower())
-    ]
+    with stage("filter"):
+        filtered_df = DF[
+            (DF["language"].str.lower() == target_lang) &
+            (DF["mood"].str.lower() == target_mood.lower())
+        ]
 
     if len(filtered_df) == 0:
         return [f"No matching {target_lang} {target_mood} comments found."]
@@ -152,7 +280,7 @@ def generate_from_prompt(user_prompt, mood=None, language=None, top_k=6):
     # If no prompt is given, just return random samples from the filtered list?
     # Or strict semantic search against empty string (bad idea)?
     # Let's say if prompt is given, return random samples.
-    if not user_prompt.strip():
+    if not semantic or not user_prompt.strip():
         # Return random samples
         sample_size = min(top_k, len(filtered_df))
         samples = filtered_df.sample(n=sample_size)
@@ -170,36 +298,52 @@ def generate_from_prompt(user_prompt, mood=None, language=None, top_k=6):
     if MODEL is None:
          return [{"comment": "Model loading failed.", "mood": "Error", "style": "Error"}]
 
-    subset_embeddings = EMBEDDINGS[subset_indices]
-
-    dimension = subset_embeddings.shape[1]
-    temp_index = faiss.IndexFlatL2(dimension)
-    temp_index.add(subset_embeddings)
-
-    query_vector = MODEL.encode([user_prompt])
-    
     # Fetch MORE results than needed (3x), then randomly sample
     # This ensures variety even for the same query
     fetch_k = min(top_k * 3, len(subset_indices))
-    distances, indices = temp_index.search(query_vector, fetch_k)
-
-    # Collect all candidates
-    candidates = []
-    for relative_idx in indices[0]:
-        if relative_idx < len(filtered_df):
-            row = filtered_df.iloc[relative_idx]
-            base_comment = row["text"]
-            varied = add_emojis(base_comment, target_mood)
-            candidates.append({
-                "comment": varied,
-                "mood": target_mood,
-                "style": row.get("style", "Smart Search") 
-            })
-    
+    cache_key = _candidate_key(target_lang, target_mood, user_prompt, fetch_k)
+    cached = _cache_get(cache_key)
+
+    if cached is None:
+        with admit():
+            with stage("index_build"):
+                subset_embeddings = EMBEDDINGS[subset_indices]
+
+                dimension = subset_embeddings.shape[1]
+                temp_index = faiss.IndexFlatL2(dimension)
+                temp_index.add(subset_embeddings)
+
+            with stage("encode"):
+                query_vector = MODEL.encode([user_prompt])
+            with stage("faiss_search"):
+                distances, indices = temp_index.search(query_vector, fetch_k)
+
+        # Map subset positions back to dataset row ids (FAISS pads with -1)
+        candidate_ids = []
+        candidate_distances = []
+        for relative_idx, distance in zip(indices[0], distances[0]):
+            if 0 <= relative_idx < len(subset_indices):
+                candidate_ids.append(subset_indices[relative_idx])
+                candidate_distances.append(float(distance))
+        cached = (candidate_ids, candidate_distances)
+        _cache_put(cache_key, cached)
+
+    candidate_ids, _ = cached
+
     # Randomly sample top_k from candidates for variety
-    if len(candidates) > top_k:
-        results = random.sample(candidates, top_k)
+    if len(candidate_ids) > top_k:
+        chosen_ids = random.sample(candidate_ids, top_k)
     else:
-        results = candidates
+        chosen_ids = candidate_ids
+
+    results = []
+    for row_id in chosen_ids:
+        row = DF.loc[row_id]
+        varied = add_emojis(row["text"], target_mood)
+        results.append({
+            "comment": varied,
+            "mood": target_mood,
+            "style": row.get("style", "Smart Search")
+        })
             
     return results